@@ -154,7 +154,7 @@ REST_FRAMEWORK = {
     
     'DEFAULT_AUTHENTICATION_CLASSES': (
         
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'myapp.authentication.CachedJWTAuthentication',
     )
 
 }
@@ -200,3 +200,122 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainSlidingSerializer",
     "SLIDING_TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSlidingSerializer",
 }   
+
+
+# Home timeline (fan-out-on-write by `python manage.py fanout_post_notifications`), see myapp/timeline.py
+TIMELINE_MAX_LENGTH = 500          # entries kept per user
+TIMELINE_FANOUT_LIMIT = 10000      # above this many subscribers, posts are pulled at read time
+TIMELINE_BATCH_SIZE = 1000
+
+FEED_COMMENT_PREVIEW_SIZE = 3      # most recent comments embedded per feed item
+
+# Notification outbox, drained by `python manage.py dispatch_notifications`
+OUTBOX_BATCH_SIZE = 200
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_BACKOFF = 2           # seconds, raised to the attempt number
+OUTBOX_BACKLOG_WARNING = 10000
+OUTBOX_CLAIM_TIMEOUT = 60          # seconds before a dead dispatcher's claimed batch is taken over
+OUTBOX_INLINE_DISPATCH = False     # True: dispatch right after commit (no worker needed)
+
+# Coalesce like/dislike/comment notifications on the same post into one aggregate per window
+NOTIFICATION_COALESCE_WINDOW = 60  # seconds, 0 disables coalescing
+NOTIFICATION_COALESCE_TYPES = ['like', 'dislike', 'comment']
+NOTIFICATION_ACTOR_SAMPLE_SIZE = 5
+
+UNREAD_COUNT_CACHE_TIMEOUT = 60 * 60   # unread badge counters are recounted at least this often
+
+# Notification retention, applied by `python manage.py purge_notifications`
+# Read notifications older than this many days are archived and deleted.
+NOTIFICATION_RETENTION_DAYS = {
+    'default': 90,
+    'like': 30,
+    'dislike': 30,
+    'comment': 90,
+    'follow': 180,
+    'post': 30,
+}
+NOTIFICATION_ARCHIVE_DIR = BASE_DIR / 'archive' / 'notifications'
+
+# Auth caches (myapp/user_cache.py): process-local LRU in front of the shared cache
+USER_CACHE_SIZE = 10000
+USER_CACHE_TTL = 30                # seconds a worker may serve a user changed in another process
+SHARED_USER_CACHE_TTL = 300       # unused with locmem: a per-process cache can't be invalidated by other workers
+TOKEN_CACHE_SIZE = 10000
+TOKEN_CACHE_TTL = 300
+
+# WebSocket resume (?since=<notification_id>): replay at most this much
+NOTIFICATION_REPLAY_LIMIT = 500
+NOTIFICATION_REPLAY_BATCH_SIZE = 50
+NOTIFICATION_REPLAY_MAX_AGE = timedelta(days=7)
+
+# New posts, pushed to timelines and notified by `python manage.py fanout_post_notifications`
+FANOUT_CHUNK_SIZE = 500
+FANOUT_PUSH_RATE = 1000            # websocket pushes per second
+
+# Per-connection websocket send queue (myapp/consumers.py)
+NOTIFICATION_SEND_QUEUE_SIZE = 100
+NOTIFICATION_SEND_BATCH_WINDOW = 0.05   # seconds; events inside the window share one frame
+NOTIFICATION_SEND_MAX_BATCH = 50
+NOTIFICATION_SEND_MAX_DROPS = 200       # drops without a successful send before disconnecting
+
+# Django cache: post/feed caches, unread counters and the shared user cache.
+# 'locmem' is per process, so invalidations don't reach other workers;
+# use 'file' (workers on one host) or 'redis' when running several.
+CACHE_BACKEND = 'locmem'
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'blog',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:6380/1',
+    },
+}
+CACHES = {'default': CACHE_BACKENDS[CACHE_BACKEND]}
+
+# Post caches (myapp/post_cache.py), invalidated by version bumps on write
+POST_CACHE_TIMEOUT = 300           # seconds an unused cached render is kept
+RECENT_POSTS_CACHE_SIZE = 200      # top-ranked posts kept in the feed's recent index
+
+# Chunked uploads (myapp/uploads.py): partial files live here until finalized
+CHUNKED_UPLOAD_DIR = BASE_DIR / 'uploads' / 'partial'
+CHUNKED_UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024         # suggested to clients
+CHUNKED_UPLOAD_MAX_SIZE = 2 * 1024 * 1024 * 1024
+CHUNKED_UPLOAD_EXPIRY = 24 * 60 * 60               # seconds; unfinalized uploads are purged by `manage.py purge_uploads`
+
+# Image variants (myapp/derivatives.py), made by a process pool; needs Pillow
+IMAGE_DERIVATIVE_SIZES = {'thumb': 320, 'medium': 1080}   # name: longest edge in px
+IMAGE_DERIVATIVE_QUALITY = 80
+IMAGE_DERIVATIVE_WORKERS = 2
+
+# Serving post media at /uploads/ (myapp/media.py)
+MEDIA_SENDFILE = None              # 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache/lighttpd) to hand files to the proxy
+MEDIA_ACCEL_PREFIX = '/protected/' # nginx `internal` location aliased to the storage root
+MEDIA_CHUNK_SIZE = 256 * 1024
+MEDIA_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Hot ranking of the feed's recent section (myapp/ranking.py)
+HOT_LIKE_WEIGHT = 1.0
+HOT_COMMENT_WEIGHT = 2.0
+HOT_DISLIKE_WEIGHT = 1.0
+HOT_HALF_LIFE = 12 * 60 * 60       # seconds for a post's engagement to count half as much
+HOT_INDEX_TTL = 30                 # seconds the cached top-ranked index is reused
+
+REACTION_BATCH_MAX_ITEMS = 100     # per POST /reactions/batch/
+
+# Write-behind reactions (myapp/reaction_buffer.py): buffer reaction writes per process and flush them in batches
+REACTION_WRITE_BEHIND = False
+REACTION_FLUSH_INTERVAL = 1.0      # seconds between flushes
+REACTION_BUFFER_MAX_ENTRIES = 10000  # flush early once this many (post, user) pairs are buffered
+
+# Follower/following lists (myapp/follows.py), cached per user and updated on subscribe/unsubscribe
+FOLLOW_CACHE_TIMEOUT = 60 * 10
+FOLLOW_CACHE_MAX_IDS = 5000        # longer lists cache only their count and are paged from the table
+FOLLOW_BULK_MAX_IDS = 100          # per POST /follows/bulk/ or GET /follows/check/
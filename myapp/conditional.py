@@ -0,0 +1,44 @@
+"""
+Conditional GET for cached read endpoints.
+
+Validators are built from post cache versions (see post_cache.py), which
+are read from the cache in one round trip, so answering 304 Not Modified
+costs no serialization and no more queries than finding out which rows a
+page holds.
+
+The ETag is the strong validator. Last-Modified (see
+post_cache.last_modified) is sent too, for clients that only keep dates,
+but it has whole seconds, so two changes within one second share a date.
+As RFC 9110 specifies, If-Modified-Since is therefore only evaluated when
+the request has no If-None-Match.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+
+def make_etag(*parts):
+    return '"%s"' % hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def not_modified(request, etag, last_modified=None):
+    """
+    A 304 response if the client's If-None-Match still matches (or, without
+    one, If-Modified-Since is not before `last_modified`), else None.
+    """
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # per-user data: clients and private caches must revalidate before reuse
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Authorization'])
+    return response
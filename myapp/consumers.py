@@ -1,6 +1,83 @@
 # myapp/consumers.py
+import asyncio
 import json
+import logging
+import weakref
+from collections import deque
+from datetime import timedelta
+from urllib.parse import parse_qs
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from .models import Notification
+from .outbox import cursor_time, parse_cursor_time, replay_frame
+
+NOTIFICATION_COALESCE_WINDOW = getattr(settings, 'NOTIFICATION_COALESCE_WINDOW', 60)
+NOTIFICATION_REPLAY_LIMIT = getattr(settings, 'NOTIFICATION_REPLAY_LIMIT', 500)
+NOTIFICATION_REPLAY_BATCH_SIZE = getattr(settings, 'NOTIFICATION_REPLAY_BATCH_SIZE', 50)
+NOTIFICATION_REPLAY_MAX_AGE = getattr(settings, 'NOTIFICATION_REPLAY_MAX_AGE', timedelta(days=7))
+NOTIFICATION_SEND_QUEUE_SIZE = getattr(settings, 'NOTIFICATION_SEND_QUEUE_SIZE', 100)
+NOTIFICATION_SEND_BATCH_WINDOW = getattr(settings, 'NOTIFICATION_SEND_BATCH_WINDOW', 0.05)
+NOTIFICATION_SEND_MAX_BATCH = getattr(settings, 'NOTIFICATION_SEND_MAX_BATCH', 50)
+NOTIFICATION_SEND_MAX_DROPS = getattr(settings, 'NOTIFICATION_SEND_MAX_DROPS', 200)
+
+# Close code for clients that can't keep up; they should reconnect with ?since=
+CLOSE_CODE_TOO_SLOW = 4008
+# Close code when sending fails; clients should reconnect with ?since=
+CLOSE_CODE_SEND_FAILED = 1011
+
+logger = logging.getLogger(__name__)
+
+# Live consumers in this process, for connection_stats()
+connections = weakref.WeakSet()
+
+
+def connection_stats():
+    """
+    Outbound queue metrics for the websocket connections of this process.
+    """
+    stats = [consumer.queue_stats() for consumer in list(connections)]
+    return {
+        'connections': len(stats),
+        'queued': sum(s['queue_depth'] for s in stats),
+        'max_queue_depth': max((s['queue_depth'] for s in stats), default=0),
+        'frames_sent': sum(s['frames_sent'] for s in stats),
+        'dropped': sum(s['dropped'] for s in stats),
+        'merged': sum(s['merged'] for s in stats),
+    }
+
+
+@database_sync_to_async
+def get_missed_notifications(user_id, since, updated_since=None):
+    """
+    Notifications newer than `since`, or aggregates updated after
+    `updated_since`, inside the replay window, oldest first, as the same
+    frames live pushes use. Returns (frames, truncated) where truncated
+    means older missed notifications were left out and the client should
+    re-sync over REST.
+    """
+    missed = Q(id__gt=since)
+    if updated_since is not None:
+        missed |= Q(updated_at__gt=updated_since)
+    missed = Notification.objects.filter(
+        missed,
+        receiver_id=user_id,
+        created_at__gte=timezone.now() - NOTIFICATION_REPLAY_MAX_AGE,
+    ).select_related('sender', 'comment').order_by('-id')[:NOTIFICATION_REPLAY_LIMIT + 1]
+    missed = list(missed)
+    truncated = len(missed) > NOTIFICATION_REPLAY_LIMIT
+    return [replay_frame(n) for n in reversed(missed[:NOTIFICATION_REPLAY_LIMIT])], truncated
+
+
+def parse_since(value):
+    try:
+        since = int(value)
+    except (TypeError, ValueError):
+        return None
+    return since if since >= 0 else None
+
 
 class NotificationConsumer(AsyncWebsocketConsumer):
     async def connect(self):
@@ -10,20 +87,172 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         else:
             # Create a group for this user
             self.group_name = f"user_{user.id}"
+            # Coalesced pushes: last send time, held payload and flush task per coalesce_key
+            self.last_push = {}
+            self.held = {}
+            self.flush_tasks = {}
+            # Bounded outbound queue drained by write_loop, the only sender on the socket;
+            # replay frames go in `control`, which is sent first and never dropped
+            self.queue = deque()
+            self.control = deque()
+            self.queue_ready = asyncio.Event()
+            self.frames_sent = 0
+            self.dropped = 0
+            self.merged = 0
+            self.drops_since_flush = 0
             await self.channel_layer.group_add(self.group_name, self.channel_name)
             await self.accept()
+            self.writer = asyncio.create_task(self.write_loop())
+            connections.add(self)
+
+            # Resume: ?since=<notification_id>&updated_since=<updated_at> replays what was
+            # missed while disconnected. Live pushes that arrive meanwhile are queued and
+            # delivered after the replay.
+            params = parse_qs(self.scope.get("query_string", b"").decode())
+            since = parse_since(params.get("since", [None])[0])
+            if since is not None:
+                await self.replay(since, parse_cursor_time(params.get("updated_since", [None])[0]))
 
     async def disconnect(self, close_code):
         user = self.scope['user']
         if not user.is_anonymous:
             await self.channel_layer.group_discard(self.group_name, self.channel_name)
+            for task in self.flush_tasks.values():
+                task.cancel()
+            if getattr(self, 'writer', None):
+                self.writer.cancel()
+            connections.discard(self)
 
     async def receive(self, text_data=None, bytes_data=None):
-        # Optional: handle messages from the client
-        pass
+        # Clients may also resume after connecting:
+        # {"type": "resume", "since": <notification_id>, "updated_since": <updated_at>}
+        try:
+            message = json.loads(text_data or "")
+        except ValueError:
+            return
+        if isinstance(message, dict) and message.get("type") == "resume":
+            since = parse_since(message.get("since"))
+            if since is not None:
+                await self.replay(since, parse_cursor_time(message.get("updated_since")))
+
+    async def replay(self, since, updated_since=None):
+        """
+        Queue missed notifications in batched frames, then a
+        replay_complete frame carrying the cursors to resume from next
+        time: the highest id and updated_at seen.
+        """
+        notifications, truncated = await get_missed_notifications(self.scope['user'].id, since, updated_since)
+        for start in range(0, len(notifications), NOTIFICATION_REPLAY_BATCH_SIZE):
+            self.control.append({
+                "type": "replay",
+                "notifications": notifications[start:start + NOTIFICATION_REPLAY_BATCH_SIZE],
+            })
+        self.control.append({
+            "type": "replay_complete",
+            "last_id": max([since] + [n["id"] for n in notifications]),
+            "last_updated_at": max(
+                [n["updated_at"] for n in notifications] + ([cursor_time(updated_since)] if updated_since else []),
+                default=None,
+            ),
+            "truncated": truncated,
+        })
+        self.queue_ready.set()
 
     async def send_notification(self, event):
         """
-        Called when a notification message is sent to this user's group
+        Called when a notification message is sent to this user's group.
+        Aggregate notifications (those carrying a coalesce_key) are pushed
+        at most once per NOTIFICATION_COALESCE_WINDOW; updates arriving
+        inside the window are held and only the latest one is sent when
+        the window closes.
+        """
+        notification = event["notification"]
+        key = notification.get("coalesce_key")
+        if not key or not NOTIFICATION_COALESCE_WINDOW:
+            self.enqueue(notification)
+            return
+
+        now = asyncio.get_running_loop().time()
+        last = self.last_push.get(key)
+        if last is None or now - last >= NOTIFICATION_COALESCE_WINDOW:
+            self.last_push[key] = now
+            self.enqueue(notification)
+        else:
+            self.held[key] = notification
+            if key not in self.flush_tasks:
+                delay = last + NOTIFICATION_COALESCE_WINDOW - now
+                self.flush_tasks[key] = asyncio.create_task(self.flush_held(key, delay))
+
+    async def flush_held(self, key, delay):
+        await asyncio.sleep(delay)
+        self.flush_tasks.pop(key, None)
+        notification = self.held.pop(key, None)
+        if notification is not None:
+            self.last_push[key] = asyncio.get_running_loop().time()
+            self.enqueue(notification)
+
+    def enqueue(self, notification):
+        """
+        Queue a notification for write_loop without waiting on the socket.
+        A queued aggregate with the same coalesce_key is replaced in place;
+        when the queue is full the oldest entry is dropped, and a client
+        that keeps overflowing is disconnected so it can resume with ?since=.
         """
-        await self.send(text_data=json.dumps(event["notification"]))
+        key = notification.get("coalesce_key")
+        if key:
+            for index, queued in enumerate(self.queue):
+                if queued.get("coalesce_key") == key:
+                    self.queue[index] = notification
+                    self.merged += 1
+                    return
+
+        if len(self.queue) >= NOTIFICATION_SEND_QUEUE_SIZE:
+            self.queue.popleft()
+            self.dropped += 1
+            self.drops_since_flush += 1
+            if self.drops_since_flush >= NOTIFICATION_SEND_MAX_DROPS:
+                self.queue.clear()
+                asyncio.create_task(self.close(code=CLOSE_CODE_TOO_SLOW))
+                return
+
+        self.queue.append(notification)
+        self.queue_ready.set()
+
+    async def write_loop(self):
+        """
+        Send queued notifications, coalescing everything that arrives within
+        NOTIFICATION_SEND_BATCH_WINDOW into one
+        {"type": "notifications", "notifications": [...]} frame. If a send
+        fails the socket is closed, and the client resumes with ?since=.
+        """
+        try:
+            while True:
+                await self.queue_ready.wait()
+                while self.control:
+                    await self.send(text_data=json.dumps(self.control.popleft()))
+                    self.frames_sent += 1
+                await asyncio.sleep(NOTIFICATION_SEND_BATCH_WINDOW)
+                batch = [self.queue.popleft() for _ in range(min(len(self.queue), NOTIFICATION_SEND_MAX_BATCH))]
+                if not self.queue and not self.control:
+                    self.queue_ready.clear()
+                if not batch:
+                    continue
+                await self.send(text_data=json.dumps({"type": "notifications", "notifications": batch}))
+                self.frames_sent += 1
+                self.drops_since_flush = 0
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Sending notifications to user %s failed, closing", self.scope['user'].id)
+            self.queue.clear()
+            self.control.clear()
+            await self.close(code=CLOSE_CODE_SEND_FAILED)
+
+    def queue_stats(self):
+        return {
+            'user_id': self.scope['user'].id,
+            'queue_depth': len(self.queue) + len(self.control),
+            'frames_sent': self.frames_sent,
+            'dropped': self.dropped,
+            'merged': self.merged,
+        }
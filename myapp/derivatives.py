@@ -0,0 +1,151 @@
+"""
+Resized and WebP variants of image posts.
+
+When a post with an image file is saved, resizing is handed to a process
+pool after the transaction commits, so request threads never decode or
+encode images. Variants are stored by content hash and size
+(see imaging.py), so the same image posted twice is resized once. When a
+worker finishes, the storage names are recorded in Post.media_variants
+and the post's cache version is bumped so feeds pick up the new URLs. A
+job that fails is recorded too, with its error, so saving the post again
+doesn't resubmit it; generate_image_derivatives --retry-failed does.
+
+`python manage.py generate_image_derivatives` backfills existing posts.
+Needs Pillow and filesystem storage; without them posts are served with
+their original file only.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+
+from . import imaging
+from .models import MediaBlob, Post
+from .post_cache import creator_post_changed
+
+logger = logging.getLogger(__name__)
+
+IMAGE_DERIVATIVE_SIZES = getattr(settings, 'IMAGE_DERIVATIVE_SIZES', {'thumb': 320, 'medium': 1080})
+IMAGE_DERIVATIVE_QUALITY = getattr(settings, 'IMAGE_DERIVATIVE_QUALITY', 80)
+IMAGE_DERIVATIVE_WORKERS = getattr(settings, 'IMAGE_DERIVATIVE_WORKERS', 2)
+IMAGE_DERIVATIVE_PREFIX = 'uploads/derived'
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tif', '.tiff'}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor(workers=None):
+    """
+    The shared worker pool, started on first use. Workers are spawned
+    rather than forked so they don't inherit the server's threads and
+    database connections.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=workers or IMAGE_DERIVATIVE_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _executor
+
+
+def enabled():
+    if imaging.Image is None:
+        return False
+    try:
+        default_storage.path('')
+    except NotImplementedError:
+        return False
+    return True
+
+
+def is_image(post):
+    return bool(post.file) and os.path.splitext(post.file.name)[1].lower() in IMAGE_EXTENSIONS
+
+
+def needs_derivatives(post, retry_failed=False):
+    variants = post.media_variants or {}
+    if not is_image(post):
+        return False
+    return variants.get('file') != post.file.name or (retry_failed and bool(variants.get('error')))
+
+
+def derivative_args(post):
+    """
+    Positional arguments for imaging.make_derivatives.
+    """
+    digest = post.blob.sha256 if post.blob_id else None
+    return (
+        default_storage.path(post.file.name), default_storage.path(''), IMAGE_DERIVATIVE_PREFIX,
+        IMAGE_DERIVATIVE_SIZES, IMAGE_DERIVATIVE_QUALITY, digest,
+    )
+
+
+def save_derivatives(post, file_name, result, error=None):
+    """
+    Record the variants made from `file_name`, unless the post's file
+    changed meanwhile. A file that isn't a readable image, or whose job
+    raised `error`, is recorded with no sizes so it isn't retried.
+    """
+    variants = {'file': file_name, 'sha256': None, 'sizes': {}}
+    updates = {'media_variants': variants}
+    if error is not None:
+        variants['error'] = repr(error)[:500]
+    elif result:
+        variants.update(result)
+        if not post.blob_id:
+            # record the hash, so the variants can be looked up by it (see media.py)
+            updates['blob'] = MediaBlob.objects.get_or_create(
+                sha256=result['sha256'], defaults={'size': default_storage.size(file_name), 'file': file_name},
+            )[0]
+    if Post.objects.filter(pk=post.pk, file=file_name).update(**updates):
+        creator_post_changed(post.pk, post.user_id)
+    return variants
+
+
+def schedule_derivatives(post):
+    """
+    Resize the post's image in the background.
+    """
+    if not enabled():
+        return None
+    file_name = post.file.name
+
+    def done(future):
+        # runs on the pool's management thread, which no request cycle cleans up after
+        close_old_connections()
+        try:
+            try:
+                result, error = future.result(), None
+            except Exception as e:
+                logger.exception("Derivatives for post %s failed", post.pk)
+                result, error = None, e
+            save_derivatives(post, file_name, result, error)
+        except Exception:
+            logger.exception("Recording derivatives for post %s failed", post.pk)
+        finally:
+            close_old_connections()
+
+    future = get_executor().submit(imaging.make_derivatives, *derivative_args(post))
+    future.add_done_callback(done)
+    return future
+
+
+def variant_urls(post):
+    """
+    {size: {format: url}} of the post's image variants.
+    """
+    variants = post.media_variants or {}
+    if variants.get('file') != (post.file.name if post.file else None):
+        return {}
+    return {
+        size_name: {fmt: default_storage.url(name) for fmt, name in names.items()}
+        for size_name, names in variants.get('sizes', {}).items()
+    }
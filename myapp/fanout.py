@@ -0,0 +1,145 @@
+"""
+Background fan-out of new posts to subscribers.
+
+Publishing a post only records a PostFanout job. The fanout_post_notifications
+worker then pages through the creator's subscriptions in chunks: each chunk
+pushes the post into the subscribers' timelines (unless the creator is
+large, see timeline.py) and bulk_creates their 'post' notifications,
+committed together with the job's resume position, followed by
+rate-limited websocket pushes. A post deleted while its fan-out runs ends
+the job instead of failing every chunk.
+"""
+import asyncio
+import logging
+import time
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from .models import Notification, Post, PostFanout, Subscription
+from .outbox import build_payload, notification_frame
+from .timeline import push_post, refresh_large_creator
+from .unread import incr_unread
+
+logger = logging.getLogger(__name__)
+
+FANOUT_CHUNK_SIZE = getattr(settings, 'FANOUT_CHUNK_SIZE', 500)
+FANOUT_PUSH_RATE = getattr(settings, 'FANOUT_PUSH_RATE', 1000)
+
+
+def enqueue_post_fanout(post):
+    return PostFanout.objects.get_or_create(post=post)[0]
+
+
+def pending_fanouts():
+    return PostFanout.objects.filter(completed_at__isnull=True).select_related('post__user')
+
+
+def _complete(fanout):
+    fanout.completed_at = timezone.now()
+    # an update rather than save(), so a job deleted along with its post is a no-op
+    PostFanout.objects.filter(pk=fanout.pk).update(completed_at=fanout.completed_at, updated_at=fanout.completed_at)
+
+
+def _post_payload(post):
+    return build_payload("post", Notification(post_id=post.id), post.user)
+
+
+async def _push_chunk(pushes):
+    """
+    Push (receiver_id, frame) pairs to each receiver's group, at most
+    FANOUT_PUSH_RATE per second.
+    """
+    channel_layer = get_channel_layer()
+    window = max(1, FANOUT_PUSH_RATE // 10)
+    failed = 0
+    for start in range(0, len(pushes), window):
+        started = time.monotonic()
+        results = await asyncio.gather(
+            *[
+                channel_layer.group_send(f"user_{receiver_id}", {"type": "send_notification", "notification": frame})
+                for receiver_id, frame in pushes[start:start + window]
+            ],
+            return_exceptions=True,
+        )
+        failed += sum(isinstance(result, BaseException) for result in results)
+        # pace so that `window` pushes take at least window / FANOUT_PUSH_RATE seconds
+        await asyncio.sleep(max(0.0, window / FANOUT_PUSH_RATE - (time.monotonic() - started)))
+    return failed
+
+
+def run_fanout_chunk(fanout, chunk_size=FANOUT_CHUNK_SIZE):
+    """
+    Push the post to the next chunk of subscribers. Returns the number
+    notified; 0 means the fan-out is complete.
+    """
+    post = fanout.post
+    if not fanout.last_subscription_id:
+        # decided once per post, so a resumed job keeps pushing or pulling
+        refresh_large_creator(post.user)
+    rows = list(
+        Subscription.objects.filter(subscribed_to_id=post.user_id, id__gt=fanout.last_subscription_id)
+        .exclude(subscriber_id=post.user_id)
+        .order_by('id')
+        .values_list('id', 'subscriber_id')[:chunk_size]
+    )
+    if not rows:
+        _complete(fanout)
+        return 0
+
+    subscriber_ids = [subscriber_id for _, subscriber_id in rows]
+    try:
+        new_ids = _store_chunk(fanout, post, rows, subscriber_ids)
+    except DatabaseError:
+        # the post (and with it this job) was deleted meanwhile: the timeline entry
+        # and notification inserts fail on its foreign key, or the job row is gone
+        if Post.objects.filter(pk=post.pk).exists():
+            raise
+        logger.info("Post %s was deleted during its fan-out, stopping", post.id)
+        _complete(fanout)
+        return 0
+    incr_unread({subscriber_id: 1 for subscriber_id in new_ids})
+
+    # frames carry each receiver's notification id, for resuming with ?since=
+    payload = _post_payload(post)
+    notifications = Notification.objects.filter(
+        notification_type='post', post=post, sender_id=post.user_id, receiver_id__in=subscriber_ids,
+    )
+    pushes = [(notification.receiver_id, notification_frame(notification, payload)) for notification in notifications]
+    failed = async_to_sync(_push_chunk)(pushes)
+    if failed:
+        # notifications are stored; those clients pick them up on reconnect replay
+        logger.warning("Fan-out of post %s: %s push(es) failed", post.id, failed)
+    return len(subscriber_ids)
+
+
+def _store_chunk(fanout, post, rows, subscriber_ids):
+    """
+    Timeline entries, notifications and the job's resume position for one
+    chunk, in one transaction. Returns the ids notified for the first time.
+    """
+    with transaction.atomic():
+        if not post.user.is_large_creator:
+            push_post(post, subscriber_ids)
+        # only newly inserted rows count as unread
+        notified = set(
+            Notification.objects.filter(
+                notification_type='post', post=post, sender_id=post.user_id, receiver_id__in=subscriber_ids,
+            ).values_list('receiver_id', flat=True)
+        )
+        new_ids = [subscriber_id for subscriber_id in subscriber_ids if subscriber_id not in notified]
+        Notification.objects.bulk_create(
+            [
+                Notification(sender_id=post.user_id, receiver_id=subscriber_id, notification_type='post', post=post)
+                for subscriber_id in new_ids
+            ],
+            ignore_conflicts=True,
+        )
+        fanout.last_subscription_id = rows[-1][0]
+        fanout.notified += len(subscriber_ids)
+        fanout.save(update_fields=['last_subscription_id', 'notified', 'updated_at'])
+    return new_ids
+
@@ -0,0 +1,209 @@
+"""
+Follower/following graph.
+
+Each user's followers and followings are cached as an adjacency entry,
+{'count': n, 'ids': [(subscription_id, user_id), ...]} newest first, so
+listing, counting and "do I follow them" checks don't touch the
+Subscription table on a hit. Past FOLLOW_CACHE_MAX_IDS only the count is
+kept, and those lists are paged and checked with indexed queries.
+
+Subscribing and unsubscribing decide against the Subscription table (its
+unique constraint and delete counts), never the cache, and update the
+cached entries of both users once the transaction commits; an entry that
+isn't cached is rebuilt on the next read. Updates are read-modify-write, so concurrent changes to one
+user may drop an update; entries expire after FOLLOW_CACHE_TIMEOUT to
+bound that.
+"""
+import bisect
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+from .models import Subscription, User
+from .post_cache import subscriptions_changed
+from .timeline import backfill_creators, remove_creators
+
+FOLLOW_CACHE_TIMEOUT = getattr(settings, 'FOLLOW_CACHE_TIMEOUT', 60 * 10)
+FOLLOW_CACHE_MAX_IDS = getattr(settings, 'FOLLOW_CACHE_MAX_IDS', 5000)
+FOLLOW_BULK_MAX_IDS = getattr(settings, 'FOLLOW_BULK_MAX_IDS', 100)
+
+FOLLOWERS = 'followers'
+FOLLOWING = 'following'
+
+# direction -> (column holding the user, column holding the other side)
+COLUMNS = {
+    FOLLOWERS: ('subscribed_to_id', 'subscriber_id'),
+    FOLLOWING: ('subscriber_id', 'subscribed_to_id'),
+}
+
+
+class FollowError(ValueError):
+    pass
+
+
+def adjacency_key(direction, user_id):
+    return f"follows:{direction}:{user_id}"
+
+
+def _load(direction, user_id):
+    own, other = COLUMNS[direction]
+    rows = Subscription.objects.filter(**{own: user_id})
+    ids = list(rows.order_by('-id').values_list('id', other)[:FOLLOW_CACHE_MAX_IDS + 1])
+    if len(ids) > FOLLOW_CACHE_MAX_IDS:
+        return {'count': rows.count(), 'ids': None}
+    return {'count': len(ids), 'ids': ids}
+
+
+def adjacency(direction, user_id):
+    """
+    The cached adjacency entry, loaded with one or two queries on a miss.
+    """
+    key = adjacency_key(direction, user_id)
+    entry = cache.get(key)
+    if entry is None:
+        entry = _load(direction, user_id)
+        cache.set(key, entry, FOLLOW_CACHE_TIMEOUT)
+    return entry
+
+
+def _update(direction, user_id, added=(), removed=()):
+    """
+    Apply [(subscription_id, other_id)] additions and other_id removals
+    to a cached entry, if there is one.
+    """
+    key = adjacency_key(direction, user_id)
+    entry = cache.get(key)
+    if entry is None:
+        return
+    if entry['ids'] is None:
+        entry['count'] = max(0, entry['count'] + len(added) - len(removed))
+    else:
+        dropped = set(removed) | {other_id for _, other_id in added}
+        ids = sorted([*added, *(pair for pair in entry['ids'] if pair[1] not in dropped)], reverse=True)
+        entry = {'count': len(ids), 'ids': ids if len(ids) <= FOLLOW_CACHE_MAX_IDS else None}
+    cache.set(key, entry, FOLLOW_CACHE_TIMEOUT)
+
+
+def follows_changed(subscriber_id, added=(), removed=()):
+    """
+    `subscriber_id` followed [(subscription_id, user_id)] `added` and
+    unfollowed the user ids in `removed`. Updates the cached entries of
+    everyone involved after commit.
+    """
+    added, removed = list(added), list(removed)
+
+    def update():
+        if any(subscription_id is None for subscription_id, _ in added):
+            # the database didn't return the new ids; rebuild on next read
+            cache.delete_many([adjacency_key(FOLLOWING, subscriber_id)] + [
+                adjacency_key(FOLLOWERS, user_id) for _, user_id in added
+            ])
+        else:
+            _update(FOLLOWING, subscriber_id, added=added)
+            for subscription_id, user_id in added:
+                _update(FOLLOWERS, user_id, added=[(subscription_id, subscriber_id)])
+        if removed:
+            _update(FOLLOWING, subscriber_id, removed=removed)
+        for user_id in removed:
+            _update(FOLLOWERS, user_id, removed=[subscriber_id])
+
+    transaction.on_commit(update)
+
+
+def follow_counts(user_id):
+    return {
+        'followers': adjacency(FOLLOWERS, user_id)['count'],
+        'following': adjacency(FOLLOWING, user_id)['count'],
+    }
+
+
+def is_following(user_id, other_ids):
+    """
+    {other_id: bool}, whether `user_id` follows each of `other_ids`.
+    """
+    entry = adjacency(FOLLOWING, user_id)
+    if entry['ids'] is not None:
+        following = {other_id for _, other_id in entry['ids']}
+    else:
+        following = set(
+            Subscription.objects.filter(subscriber_id=user_id, subscribed_to_id__in=other_ids)
+            .values_list('subscribed_to_id', flat=True)
+        )
+    return {other_id: other_id in following for other_id in other_ids}
+
+
+def adjacency_page(direction, user_id, after=None, limit=20):
+    """
+    [(subscription_id, user_id)] newest first, past subscription id `after`.
+    """
+    entry = adjacency(direction, user_id)
+    if entry['ids'] is not None:
+        ids = entry['ids']
+        start = bisect.bisect_right(ids, -after, key=lambda pair: -pair[0]) if after is not None else 0
+        return ids[start:start + limit]
+    own, other = COLUMNS[direction]
+    rows = Subscription.objects.filter(**{own: user_id})
+    if after is not None:
+        rows = rows.filter(id__lt=after)
+    return list(rows.order_by('-id').values_list('id', other)[:limit])
+
+
+def _user_ids(value, name):
+    if value is None:
+        return []
+    if not isinstance(value, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in value):
+        raise FollowError(f"{name} must be a list of user ids")
+    return list(dict.fromkeys(value))
+
+
+def bulk_follow(user, follow=None, unfollow=None):
+    """
+    Follow and unfollow many users with one bulk_create and one delete.
+    Returns {user_id: status}, status being followed, unfollowed,
+    unchanged or not_found. What changes is read from the Subscription
+    table; a concurrent change to the same rows rolls everything back.
+    """
+    from .signals import enqueue_notifications  # signals.py imports this module
+
+    follow, unfollow = _user_ids(follow, 'follow'), _user_ids(unfollow, 'unfollow')
+    if len(follow) + len(unfollow) > FOLLOW_BULK_MAX_IDS:
+        raise FollowError(f"At most {FOLLOW_BULK_MAX_IDS} users per request")
+    if set(follow) & set(unfollow):
+        raise FollowError("A user can't be both followed and unfollowed")
+
+    statuses = {user_id: 'unchanged' for user_id in follow + unfollow}
+    try:
+        with transaction.atomic():
+            existing = dict(
+                Subscription.objects.filter(subscriber=user, subscribed_to_id__in=follow + unfollow)
+                .values_list('subscribed_to_id', 'id')
+            )
+            creators = User.objects.only('id').in_bulk([user_id for user_id in follow if user_id not in existing])
+            removed = [user_id for user_id in unfollow if user_id in existing]
+            statuses.update({user_id: 'not_found' for user_id in follow if user_id not in existing and user_id not in creators})
+            # a follow inserted meanwhile trips the unique constraint
+            created = Subscription.objects.bulk_create([
+                Subscription(subscriber=user, subscribed_to_id=creator_id) for creator_id in creators
+            ])
+            if removed:
+                # post_delete signals keep the adjacency cache and feed versions current
+                _, deleted = Subscription.objects.filter(pk__in=[existing[user_id] for user_id in removed]).delete()
+                if deleted.get(Subscription._meta.label, 0) != len(removed):
+                    raise FollowError("Subscriptions changed meanwhile, please retry")
+                remove_creators(user, removed)
+            if created:
+                # bulk_create skips post_save: notify, backfill and bump here
+                enqueue_notifications([
+                    (subscription.subscribed_to_id, 'follow', subscription, user, None)
+                    for subscription in created if subscription.subscribed_to_id != user.id
+                ])
+                backfill_creators(user, list(creators))
+                subscriptions_changed(user.id)
+                follows_changed(user.id, added=[(s.id, s.subscribed_to_id) for s in created])
+    except IntegrityError:
+        raise FollowError("Subscriptions changed meanwhile, please retry")
+
+    statuses.update({creator_id: 'followed' for creator_id in creators})
+    statuses.update({user_id: 'unfollowed' for user_id in removed})
+    return statuses
@@ -0,0 +1,69 @@
+"""
+Image resizing, run in worker processes by myapp/derivatives.py.
+
+Nothing here imports Django, so a freshly spawned worker only has to
+import Pillow. Pillow is optional: without it no derivatives are made.
+"""
+import hashlib
+import os
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - optional dependency
+    Image = None
+
+READ_SIZE = 64 * 1024
+
+
+def file_sha256(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for data in iter(lambda: f.read(READ_SIZE), b''):
+            hasher.update(data)
+    return hasher.hexdigest()
+
+
+def derivative_name(prefix, digest, size_name, fmt):
+    ext = 'jpg' if fmt == 'jpeg' else fmt
+    return f"{prefix}/{digest[:2]}/{digest}_{size_name}.{ext}"
+
+
+def make_derivatives(source, root, prefix, sizes, quality, digest=None):
+    """
+    Write a downscaled copy of the image at `source` for each of `sizes`
+    ({name: longest edge in px}) in its own format (JPEG, or PNG with
+    transparency) and as WebP. Files are named by content hash and size
+    under root/prefix, and ones that already exist are reused.
+
+    Returns {"sha256": digest, "sizes": {name: {format: storage name}}},
+    or None if `source` is not an image Pillow can read.
+    """
+    if Image is None:
+        return None
+    digest = digest or file_sha256(source)
+    variants = {}
+    try:
+        with Image.open(source) as image:
+            image = ImageOps.exif_transpose(image)
+            has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+            for size_name, edge in sizes.items():
+                names = {}
+                resized = None
+                for fmt in ('png' if has_alpha else 'jpeg', 'webp'):
+                    name = derivative_name(prefix, digest, size_name, fmt)
+                    path = os.path.join(root, name)
+                    if not os.path.exists(path):
+                        if resized is None:
+                            resized = image.copy()
+                            resized.thumbnail((edge, edge), Image.LANCZOS)
+                        os.makedirs(os.path.dirname(path), exist_ok=True)
+                        # write to a temp name so readers never see a partial file
+                        tmp = f"{path}.{os.getpid()}.tmp"
+                        resized.save(tmp, format=fmt.upper(), quality=quality, optimize=fmt != 'webp')
+                        os.replace(tmp, path)
+                    names[fmt] = name
+                variants[size_name] = names
+    except (OSError, Image.DecompressionBombError):
+        return None
+    return {"sha256": digest, "sizes": variants}
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+
+from myapp import user_cache
+from myapp.authentication import CachedJWTAuthentication
+from myapp.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare queries and time per authenticated request for simplejwt's JWTAuthentication "
+        "and CachedJWTAuthentication. Runs inside a rolled-back transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = User.objects.create_user(email='bench-auth@example.com', name='bench', tc=True, password='bench')
+            header = f"Bearer {AccessToken.for_user(user)}"
+            factory = APIRequestFactory()
+
+            for authenticator in (JWTAuthentication(), CachedJWTAuthentication()):
+                user_cache.user_cache.clear()
+                user_cache.invalidate_user(user.pk)
+                queries, elapsed = self.run(authenticator, factory, header, options['requests'])
+                self.stdout.write(
+                    f"{type(authenticator).__name__:>26}: "
+                    f"{queries / options['requests']:.3f} queries/request, "
+                    f"{elapsed * 1e6 / options['requests']:.1f} us/request"
+                )
+
+            transaction.set_rollback(True)
+
+    def run(self, authenticator, factory, header, requests):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            for _ in range(requests):
+                request = Request(factory.get('/feed/', HTTP_AUTHORIZATION=header))
+                authenticator.authenticate(request)
+            elapsed = time.perf_counter() - started
+        return len(captured.captured_queries), elapsed
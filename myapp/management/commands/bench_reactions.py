@@ -0,0 +1,111 @@
+import os
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection, connections
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from myapp import reaction_buffer
+from myapp.management.commands.ws_loadtest import percentile
+from myapp.models import NotificationOutbox, Post, Reaction, User
+from myapp.views import PostReactionView
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare reaction throughput on one hot post with and without the write-behind buffer. "
+        "Concurrent threads toggle likes through PostReactionView on a throwaway SQLite database. "
+        "Requests failing with a database error (e.g. 'database is locked') are retried, as a client "
+        "would; retries count towards latency, and requests that still fail are reported separately."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=1000, help="Reaction requests per mode.")
+        parser.add_argument('--flush-interval', type=float, default=0.5)
+        parser.add_argument('--retries', type=int, default=20, help="Attempts per request on database errors.")
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(tmp, 'bench.sqlite3')
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                self.run(options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run(self, options):
+        creator = User.objects.create_user(email='bench-creator@example.com', name='creator', tc=True, password='x')
+        post = Post.objects.create(user=creator, title='hot', content='hot post', post_type='note')
+        users = [
+            User.objects.create_user(email=f'bench-{i}@example.com', name=f'bench{i}', tc=True, password='x')
+            for i in range(options['users'])
+        ]
+
+        for write_behind in (False, True):
+            Reaction.objects.all().delete()
+            NotificationOutbox.objects.all().delete()
+            Post.objects.filter(pk=post.pk).update(like_count=0, dislike_count=0)
+            buffer = reaction_buffer.buffer
+            buffer.flush_interval = options['flush_interval']
+            flushes = buffer.flushes
+            reaction_buffer.REACTION_WRITE_BEHIND = write_behind
+
+            latencies, retries, errors, elapsed = self.load(post, users, options)
+            flush_started = time.perf_counter()
+            buffer.flush()
+            flush_elapsed = time.perf_counter() - flush_started
+
+            post.refresh_from_db()
+            rows = Reaction.objects.filter(post=post, reaction_type='like').count()
+            done = len(latencies)
+            self.stdout.write(
+                f"{'write-behind' if write_behind else 'direct':>12}: "
+                f"{done / elapsed:.0f} req/s, p50 {percentile(latencies, 50) * 1e3:.2f} ms, "
+                f"p99 {percentile(latencies, 99) * 1e3:.2f} ms, {retries} retries, {errors} failed"
+                + (f", {buffer.flushes - flushes} flushes (final {flush_elapsed * 1e3:.1f} ms)" if write_behind else "")
+                + f"; like_count {post.like_count}, like rows {rows}"
+            )
+        reaction_buffer.REACTION_WRITE_BEHIND = False
+
+    def load(self, post, users, options):
+        factory = APIRequestFactory()
+        view = PostReactionView.as_view()
+        latencies, retries, errors = [], [0], [0]
+        lock = threading.Lock()
+        per_thread = options['requests'] // options['threads']
+
+        def worker(offset):
+            try:
+                for i in range(per_thread):
+                    user = users[(offset + i * options['threads']) % len(users)]
+                    started = time.perf_counter()
+                    for attempt in range(options['retries']):
+                        request = factory.post(f'/post-reaction/{post.pk}/', {'reaction_type': 'like'}, format='json')
+                        force_authenticate(request, user=user)
+                        try:
+                            view(request, pk=post.pk)
+                            break
+                        except DatabaseError:
+                            with lock:
+                                retries[0] += 1
+                            time.sleep(0.001 * 2 ** min(attempt, 6))
+                    else:
+                        with lock:
+                            errors[0] += 1
+                        continue
+                    with lock:
+                        latencies.append(time.perf_counter() - started)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(offset,)) for offset in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, retries[0], errors[0], time.perf_counter() - started
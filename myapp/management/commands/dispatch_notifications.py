@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from myapp.outbox import OUTBOX_BACKLOG_WARNING, OUTBOX_BATCH_SIZE, dispatch_batch, outbox_stats
+
+
+class Command(BaseCommand):
+    help = "Drain the notification outbox: store notifications and push them over websockets in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=OUTBOX_BATCH_SIZE)
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds to sleep when the outbox is empty.")
+        parser.add_argument('--stats-every', type=float, default=30.0, help="Seconds between backlog reports.")
+        parser.add_argument('--once', action='store_true', help="Drain what is ready and exit.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_report = 0.0
+
+        while True:
+            delivered, failed = dispatch_batch(batch_size)
+            if delivered or failed:
+                self.stdout.write(f"Delivered {delivered}, failed {failed}")
+
+            if options['once'] and not delivered:
+                self.report(outbox_stats())
+                return
+
+            now = time.monotonic()
+            if now - last_report >= options['stats_every']:
+                self.report(outbox_stats())
+                last_report = now
+            if not delivered:
+                time.sleep(options['interval'])
+
+    def report(self, stats):
+        line = (
+            f"Outbox: {stats['pending']} pending ({stats['ready']} ready), "
+            f"{stats['dead']} dead, lag {stats['lag_seconds']:.1f}s"
+        )
+        if stats['pending'] > OUTBOX_BACKLOG_WARNING:
+            self.stderr.write(self.style.WARNING(line))
+        else:
+            self.stdout.write(line)
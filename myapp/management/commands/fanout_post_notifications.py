@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from myapp.fanout import FANOUT_CHUNK_SIZE, pending_fanouts, run_fanout_chunk
+from myapp.timeline import refresh_large_creators
+
+
+class Command(BaseCommand):
+    help = (
+        "Push new posts into subscribers' timelines and notify them, in chunks. Progress is saved after "
+        "every chunk, so an interrupted run resumes where it stopped. Also recomputes which creators are "
+        "too large to fan out to. Run a single worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=FANOUT_CHUNK_SIZE)
+        parser.add_argument('--interval', type=float, default=2.0, help="Seconds to sleep when there is no work.")
+        parser.add_argument('--once', action='store_true', help="Finish pending fan-outs and exit.")
+        parser.add_argument(
+            '--refresh-interval', type=float, default=600,
+            help="Seconds between recomputing the large creator flags.",
+        )
+
+    def handle(self, *args, **options):
+        refreshed_at = None
+        while True:
+            if refreshed_at is None or time.monotonic() - refreshed_at >= options['refresh_interval']:
+                flagged, unflagged = refresh_large_creators()
+                if flagged or unflagged:
+                    self.stdout.write(f"Large creators: {flagged} flagged, {unflagged} back to fan-out on write")
+                refreshed_at = time.monotonic()
+
+            fanouts = list(pending_fanouts()[:10])
+            for fanout in fanouts:
+                # one chunk per job per pass, so a huge audience doesn't starve newer posts
+                notified = run_fanout_chunk(fanout, options['chunk_size'])
+                if notified:
+                    self.stdout.write(f"Post {fanout.post_id}: notified {fanout.notified} so far")
+                else:
+                    self.stdout.write(self.style.SUCCESS(f"Post {fanout.post_id}: done, {fanout.notified} notified"))
+
+            if not fanouts:
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
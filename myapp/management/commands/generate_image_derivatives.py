@@ -0,0 +1,58 @@
+from concurrent.futures import as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.derivatives import derivative_args, enabled, get_executor, is_image, needs_derivatives, save_derivatives
+from myapp.models import Post
+
+
+class Command(BaseCommand):
+    help = "Generate resized and WebP variants for image posts that don't have them yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Redo posts that already have variants.")
+        parser.add_argument('--retry-failed', action='store_true', help="Redo posts whose earlier job failed.")
+        parser.add_argument('--workers', type=int, default=None, help="Worker processes (default IMAGE_DERIVATIVE_WORKERS).")
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        if not enabled():
+            raise CommandError("Image derivatives need Pillow and filesystem storage.")
+        executor = get_executor(options['workers'])
+        posts = Post.objects.exclude(file='').exclude(file__isnull=True).select_related('blob').order_by('id')
+
+        last_id = 0
+        done = skipped = failed = 0
+        while True:
+            batch = list(posts.filter(id__gt=last_id)[:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            todo = [
+                post for post in batch
+                if is_image(post) and (options['all'] or needs_derivatives(post, options['retry_failed']))
+            ]
+            futures = {executor.submit(*self.job(post)): post for post in todo}
+            for future in as_completed(futures):
+                post = futures[future]
+                try:
+                    result, error = future.result(), None
+                except Exception as e:
+                    self.stderr.write(f"Post {post.id}: {e!r}")
+                    result, error = None, e
+                variants = save_derivatives(post, post.file.name, result, error)
+                if error is not None:
+                    failed += 1
+                elif variants['sizes']:
+                    done += 1
+                else:
+                    skipped += 1
+            self.stdout.write(f"Up to post {last_id}: {done} done, {skipped} unreadable, {failed} failed")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated variants for {done} post(s), {skipped} unreadable, {failed} failed"
+        ))
+
+    def job(self, post):
+        from myapp.imaging import make_derivatives
+        return (make_derivatives, *derivative_args(post))
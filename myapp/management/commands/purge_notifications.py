@@ -0,0 +1,108 @@
+import gzip
+import json
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from myapp.models import Notification
+
+NOTIFICATION_RETENTION_DAYS = getattr(settings, 'NOTIFICATION_RETENTION_DAYS', {'default': 90})
+NOTIFICATION_ARCHIVE_DIR = getattr(settings, 'NOTIFICATION_ARCHIVE_DIR', Path(settings.BASE_DIR) / 'archive' / 'notifications')
+
+ARCHIVE_FIELDS = [
+    'id', 'sender_id', 'receiver_id', 'notification_type', 'post_id', 'comment_id',
+    'actor_count', 'recent_actors', 'is_read', 'created_at',
+]
+
+
+def read_notifications():
+    """
+    Notifications that are read, either under the receiver's watermark or flagged individually.
+    """
+    return Notification.objects.filter(
+        Q(is_read=True) | Q(id__lte=F('receiver__notification_read_marker__last_read_id'))
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Archive read notifications past their retention period to compressed NDJSON and delete them "
+        "in small batches, so no single transaction holds the write lock for long."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--sleep', type=float, default=0.05, help="Seconds to pause between batches.")
+        parser.add_argument('--no-archive', action='store_true', help="Delete without writing an archive.")
+        parser.add_argument('--dry-run', action='store_true', help="Count what would be purged.")
+        parser.add_argument('--vacuum', action='store_true', help="Reclaim free pages afterwards (SQLite only).")
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        default_days = NOTIFICATION_RETENTION_DAYS.get('default', 90)
+        types = [choice for choice, _ in Notification.NOTIFICATION_TYPES] + ['dislike']
+
+        archive = None
+        if not options['no_archive'] and not options['dry_run']:
+            archive_dir = Path(NOTIFICATION_ARCHIVE_DIR)
+            archive_dir.mkdir(parents=True, exist_ok=True)
+            archive_path = archive_dir / f"notifications-{now:%Y%m%dT%H%M%S}.ndjson.gz"
+            archive = gzip.open(archive_path, 'at', encoding='utf-8')
+
+        total = 0
+        try:
+            for notification_type in types:
+                days = NOTIFICATION_RETENTION_DAYS.get(notification_type, default_days)
+                if days is None:
+                    continue
+                expired = read_notifications().filter(
+                    notification_type=notification_type,
+                    created_at__lt=now - timedelta(days=days),
+                )
+                purged = self.purge(expired, archive, options)
+                if purged:
+                    self.stdout.write(f"{notification_type}: {purged} notification(s) older than {days} days")
+                total += purged
+        finally:
+            if archive is not None:
+                archive.close()
+
+        verb = "Would purge" if options['dry_run'] else "Purged"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {total} notification(s)."))
+        if archive is not None and total:
+            self.stdout.write(f"Archived to {archive_path}")
+        elif archive is not None:
+            archive_path.unlink()
+
+        if options['vacuum'] and not options['dry_run'] and connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
+
+    def purge(self, expired, archive, options):
+        if options['dry_run']:
+            return expired.count()
+
+        purged = 0
+        last_pk = 0
+        while True:
+            rows = list(
+                expired.filter(pk__gt=last_pk).order_by('pk').values(*ARCHIVE_FIELDS)[:options['batch_size']]
+            )
+            if not rows:
+                return purged
+            last_pk = rows[-1]['id']
+            if archive is not None:
+                for row in rows:
+                    archive.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+                archive.flush()
+            with transaction.atomic():
+                Notification.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+            purged += len(rows)
+            time.sleep(options['sleep'])
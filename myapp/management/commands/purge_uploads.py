@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from myapp.uploads import CHUNKED_UPLOAD_EXPIRY, purge_abandoned
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete chunked uploads that were never finalized and have been idle for CHUNKED_UPLOAD_EXPIRY "
+        "seconds, along with their partial files and any partial file no upload refers to."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than', type=int, default=CHUNKED_UPLOAD_EXPIRY,
+            help="Idle seconds after which an upload is abandoned.",
+        )
+        parser.add_argument('--dry-run', action='store_true', help="Count what would be purged.")
+
+    def handle(self, *args, **options):
+        uploads, files = purge_abandoned(options['older_than'], dry_run=options['dry_run'])
+        verb = "Would purge" if options['dry_run'] else "Purged"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {uploads} upload(s) and {files} partial file(s)."))
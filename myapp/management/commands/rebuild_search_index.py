@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from myapp.search import rebuild_index, search_enabled
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of posts and comments from scratch."
+
+    def handle(self, *args, **options):
+        if not search_enabled():
+            raise CommandError("Full-text search needs the SQLite backend (FTS5).")
+        # one transaction, so searches never see a half-built index
+        with transaction.atomic():
+            posts, comments = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {posts} post(s) and {comments} comment(s)"))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from myapp.models import Subscription, TimelineEntry, User
+from myapp.timeline import backfill_timeline
+
+
+class Command(BaseCommand):
+    help = "Rebuild materialized home timelines from the subscription graph."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help="Only rebuild the timeline of this user id.")
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(subscriptions__isnull=False).distinct()
+        if options['user']:
+            users = users.filter(pk=options['user'])
+
+        rebuilt = 0
+        for user in users.iterator():
+            TimelineEntry.objects.filter(user=user).delete()
+            for subscription in Subscription.objects.filter(subscriber=user).select_related('subscribed_to'):
+                backfill_timeline(user, subscription.subscribed_to)
+            rebuilt += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} timeline(s)."))
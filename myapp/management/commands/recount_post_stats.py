@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from myapp.models import Comment, Post, Reaction
+
+
+def count_of(queryset):
+    counted = queryset.order_by().values('post').annotate(n=Count('id')).values('n')
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized like/dislike/comment counters on Post and repair any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Report drift without writing.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fields = ['like_count', 'dislike_count', 'comment_count']
+        checked = repaired = 0
+        last_id = 0
+
+        while True:
+            batch = list(
+                Post.objects.filter(pk__gt=last_id).order_by('pk')
+                .only('pk', *fields)
+                .annotate(
+                    actual_like_count=count_of(Reaction.objects.filter(post=OuterRef('pk'), reaction_type=Reaction.LIKE)),
+                    actual_dislike_count=count_of(Reaction.objects.filter(post=OuterRef('pk'), reaction_type=Reaction.DISLIKE)),
+                    actual_comment_count=count_of(Comment.objects.filter(post=OuterRef('pk'))),
+                )[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].pk
+            checked += len(batch)
+
+            drifted = []
+            for post in batch:
+                if any(getattr(post, field) != getattr(post, f'actual_{field}') for field in fields):
+                    for field in fields:
+                        setattr(post, field, getattr(post, f'actual_{field}'))
+                    drifted.append(post)
+
+            repaired += len(drifted)
+            if drifted and not options['dry_run']:
+                with transaction.atomic():
+                    Post.objects.bulk_update(drifted, fields)
+                    Post.update_hot_scores([post.pk for post in drifted])
+
+        verb = "Found" if options['dry_run'] else "Repaired"
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} post(s). {verb} {repaired} with drifted counters."))
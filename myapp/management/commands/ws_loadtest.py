@@ -0,0 +1,207 @@
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework_simplejwt.tokens import AccessToken
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Client:
+    """
+    Minimal in-process websocket client for the ASGI application.
+    """
+
+    def __init__(self, application, user, token):
+        self.user = user
+        self.communicator = ApplicationCommunicator(application, {
+            'type': 'websocket',
+            'path': '/ws/notifications/',
+            'query_string': f'token={token}'.encode(),
+            'headers': [],
+            'subprotocols': [],
+        })
+
+    async def connect(self):
+        started = time.perf_counter()
+        await self.communicator.send_input({'type': 'websocket.connect'})
+        response = await self.communicator.receive_output(timeout=30)
+        if response['type'] != 'websocket.accept':
+            raise RuntimeError(f"Connection for user {self.user.id} rejected: {response}")
+        return time.perf_counter() - started
+
+    async def read(self, expected, latencies, done):
+        while True:
+            message = await self.communicator.output_queue.get()
+            if message['type'] != 'websocket.send':
+                return
+            received = time.perf_counter()
+            frame = json.loads(message['text'])
+            if frame.get('type') != 'notifications':
+                continue
+            for notification in frame['notifications']:
+                key = (self.user.id, notification['sender']['id'], notification['type'], notification['post_id'])
+                sent = expected.pop(key, None)
+                if sent is not None:
+                    latencies.append(received - sent)
+            if not expected:
+                done.set()
+
+    async def close(self):
+        await self.communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await self.communicator.wait(timeout=5)
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test ws/notifications/ offline: run Blog.asgi.application in-process on an in-memory "
+        "channel layer and a throwaway SQLite database, open N authenticated clients, generate reactions "
+        "and comments, and report connect latency, end-to-end push latency and memory per connection."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=200, help="Concurrent websocket connections.")
+        parser.add_argument('--actors', type=int, default=20, help="Users generating reactions and comments.")
+        parser.add_argument('--rounds', type=int, default=5, help="Events sent to every client.")
+        parser.add_argument('--batch-window', type=float, default=None, help="Override NOTIFICATION_SEND_BATCH_WINDOW.")
+        parser.add_argument('--timeout', type=float, default=60.0)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        settings.CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+        from channels.layers import channel_layers
+        channel_layers.backends = {}
+
+        from myapp import consumers, outbox
+        # measure every event individually
+        consumers.NOTIFICATION_COALESCE_WINDOW = 0
+        outbox.NOTIFICATION_COALESCE_WINDOW = 0
+        if options['batch_window'] is not None:
+            consumers.NOTIFICATION_SEND_BATCH_WINDOW = options['batch_window']
+
+        with tempfile.TemporaryDirectory() as tmp:
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(tmp, 'loadtest.sqlite3')
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                asyncio.run(self.run(options))
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    async def run(self, options):
+        from Blog.asgi import application
+        from myapp.models import Comment, Post, Reaction, User
+        from myapp.outbox import drain
+
+        @sync_to_async
+        def create_users():
+            owners = [
+                User.objects.create_user(email=f'owner{i}@loadtest.local', name=f'owner{i}', tc=True, password='x')
+                for i in range(options['clients'])
+            ]
+            actors = [
+                User.objects.create_user(email=f'actor{i}@loadtest.local', name=f'actor{i}', tc=True, password='x')
+                for i in range(options['actors'])
+            ]
+            posts = [Post.objects.create(user=owner, post_type='note', content='load test') for owner in owners]
+            return owners, actors, posts
+
+        owners, actors, posts = await create_users()
+        self.stdout.write(f"Created {len(owners)} clients, {len(actors)} actors")
+
+        # Connect
+        tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        clients = [Client(application, owner, AccessToken.for_user(owner)) for owner in owners]
+        connect_started = time.perf_counter()
+        connect_latencies = await asyncio.gather(*[client.connect() for client in clients])
+        connect_elapsed = time.perf_counter() - connect_started
+        after, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        expected = {}
+        latencies = []
+        done = asyncio.Event()
+        readers = [asyncio.create_task(client.read(expected, latencies, done)) for client in clients]
+
+        @sync_to_async
+        def generate(round_number):
+            """
+            One reaction or comment on every client's post, then drain the outbox.
+            """
+            for post in posts:
+                actor = actors[(round_number + post.id) % len(actors)]
+                if round_number % 2 == 0 and not Reaction.objects.filter(post=post, user=actor).exists():
+                    reaction_type = random.choice([Reaction.LIKE, Reaction.DISLIKE])
+                    expected[(post.user_id, actor.id, reaction_type, post.id)] = time.perf_counter()
+                    Reaction.objects.create(post=post, user=actor, reaction_type=reaction_type)
+                else:
+                    expected[(post.user_id, actor.id, 'comment', post.id)] = time.perf_counter()
+                    Comment.objects.create(post=post, user=actor, content=f'round {round_number}')
+            dispatch_started = time.perf_counter()
+            delivered, failed = drain()
+            return delivered, failed, time.perf_counter() - dispatch_started
+
+        total_events = 0
+        dispatch_time = 0.0
+        load_started = time.perf_counter()
+        for round_number in range(options['rounds']):
+            delivered, failed, elapsed = await generate(round_number)
+            total_events += delivered
+            dispatch_time += elapsed
+            if failed:
+                self.stderr.write(f"Round {round_number}: {failed} push(es) failed")
+
+        try:
+            await asyncio.wait_for(done.wait(), timeout=options['timeout'])
+        except asyncio.TimeoutError:
+            pass
+        load_elapsed = time.perf_counter() - load_started
+
+        for reader in readers:
+            reader.cancel()
+        await asyncio.gather(*[client.close() for client in clients], return_exceptions=True)
+
+        self.report(options, connect_latencies, connect_elapsed, (after - before) / len(clients),
+                    latencies, len(expected), total_events, dispatch_time, load_elapsed)
+
+    def report(self, options, connect_latencies, connect_elapsed, bytes_per_connection,
+               latencies, missing, total_events, dispatch_time, load_elapsed):
+        ms = 1000
+        self.stdout.write(f"\nConnections: {options['clients']} in {connect_elapsed:.2f}s")
+        self.stdout.write(
+            f"  connect latency ms: p50 {percentile(connect_latencies, 50) * ms:.1f}  "
+            f"p90 {percentile(connect_latencies, 90) * ms:.1f}  "
+            f"p99 {percentile(connect_latencies, 99) * ms:.1f}  "
+            f"max {max(connect_latencies) * ms:.1f}"
+        )
+        self.stdout.write(f"  memory per connection: {bytes_per_connection / 1024:.1f} KiB (tracemalloc)")
+
+        self.stdout.write(f"\nPushes: {len(latencies)} received, {missing} missing, {total_events} dispatched")
+        if latencies:
+            self.stdout.write(
+                f"  end-to-end latency ms: p50 {percentile(latencies, 50) * ms:.1f}  "
+                f"p90 {percentile(latencies, 90) * ms:.1f}  "
+                f"p99 {percentile(latencies, 99) * ms:.1f}  "
+                f"max {max(latencies) * ms:.1f}  mean {statistics.mean(latencies) * ms:.1f}"
+            )
+        if dispatch_time:
+            self.stdout.write(f"  outbox dispatch: {total_events / dispatch_time:.0f} notifications/s")
+        self.stdout.write(f"  load phase: {load_elapsed:.2f}s")
@@ -0,0 +1,150 @@
+"""
+Serving post media under /uploads/.
+
+Only files that belong to a post are served, checked with one indexed
+query: originals by Post.file, variants under uploads/derived/ by the
+content hash in their name. Responses carry an ETag (the content hash
+where known) and long-lived private cache headers, and support single
+byte ranges so clients can seek in videos.
+
+With MEDIA_SENDFILE set, the file itself is handed to the proxy
+(nginx X-Accel-Redirect or Apache/lighttpd X-Sendfile), which also
+handles ranges; otherwise it's streamed in MEDIA_CHUNK_SIZE pieces.
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .derivatives import IMAGE_DERIVATIVE_PREFIX
+from .models import MediaBlob, Post
+
+MEDIA_SENDFILE = getattr(settings, 'MEDIA_SENDFILE', None)  # None, 'x-accel-redirect' or 'x-sendfile'
+MEDIA_ACCEL_PREFIX = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected/')
+MEDIA_CHUNK_SIZE = getattr(settings, 'MEDIA_CHUNK_SIZE', 256 * 1024)
+MEDIA_CACHE_MAX_AGE = getattr(settings, 'MEDIA_CACHE_MAX_AGE', 365 * 24 * 60 * 60)
+
+DERIVED_NAME = re.compile(
+    rf'^{re.escape(IMAGE_DERIVATIVE_PREFIX)}/[0-9a-f]{{2}}/(?P<sha256>[0-9a-f]{{64}})_\w+\.(?:jpg|png|webp)$'
+)
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+def lookup(name):
+    """
+    (etag, content_type) for a servable media file, or None if no post uses it.
+    An etag of None means the content hash isn't known.
+    """
+    derived = DERIVED_NAME.match(name)
+    if derived:
+        if not MediaBlob.objects.filter(sha256=derived['sha256'], posts__isnull=False).exists():
+            return None
+        return f'"{os.path.splitext(os.path.basename(name))[0]}"', None
+    row = Post.objects.filter(file=name).values_list('blob__sha256', 'blob__content_type').first()
+    if row is None:
+        return None
+    sha256, content_type = row
+    return (f'"{sha256}"' if sha256 else None), content_type or None
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single-range Range header, or None to
+    send the whole file (no header, or one we don't handle, like multiple
+    ranges).
+    """
+    match = RANGE.match(header.strip()) if header else None
+    if not match or match[1] == match[2] == '':
+        return None
+    if match[1] == '':
+        # suffix range: the last N bytes
+        length = int(match[2])
+        if length == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - length), size - 1
+    start = int(match[1])
+    end = min(int(match[2]), size - 1) if match[2] else size - 1
+    if start >= size or end < start:
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+def iter_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(MEDIA_CHUNK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def serve(request, name):
+    """
+    Response for the media file `name` (a storage name under uploads/),
+    or None if it isn't a post's media or doesn't exist.
+    """
+    if '..' in name.split('/'):
+        return None
+    found = lookup(name)
+    if found is None:
+        return None
+    etag, content_type = found
+    try:
+        path = default_storage.path(name)
+        stat = os.stat(path)
+    except (SuspiciousFileOperation, NotImplementedError, OSError):
+        return None
+    etag = etag or f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    content_type = content_type or mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        response = _file_response(request, name, path, stat.st_size, etag, content_type)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    # names are unique per content, so clients may keep them; private since media needs auth
+    patch_cache_control(response, private=True, max_age=MEDIA_CACHE_MAX_AGE)
+    return response
+
+
+def _file_response(request, name, path, size, etag, content_type):
+    if MEDIA_SENDFILE == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = MEDIA_ACCEL_PREFIX.rstrip('/') + '/' + name
+        return response
+    if MEDIA_SENDFILE == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+        return response
+
+    # If-Range: only send the part if the client's copy is still current
+    if_range = request.headers.get('If-Range')
+    try:
+        byte_range = parse_range(request.headers.get('Range'), size) if not if_range or if_range == etag else None
+    except RangeNotSatisfiable:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+        response.block_size = MEDIA_CHUNK_SIZE
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(iter_range(path, start, end - start + 1), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    response['Accept-Ranges'] = 'bytes'
+    return response
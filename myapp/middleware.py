@@ -3,16 +3,26 @@ from django.conf import settings
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
 from channels.middleware import BaseMiddleware
+from . import user_cache
 
-# Lazy import of User model
+# Lazy import of User model (inside user_cache.load_user)
 @database_sync_to_async
 def get_user(user_id):
-    from django.contrib.auth import get_user_model  # ⚠ move inside function
-    User = get_user_model()
-    try:
-        return User.objects.get(id=user_id)
-    except User.DoesNotExist:
-        return None
+    return user_cache.fetch_user(user_id)
+
+
+def resolve_token(token):
+    """
+    User id for a token, skipping the signature check for tokens verified recently.
+    Raises jwt.InvalidTokenError for bad or expired tokens.
+    """
+    user_id = user_cache.verified_token_user_id(token)
+    if user_id is None:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
+        user_id = payload.get("user_id")
+        user_cache.remember_token(token, user_id, payload.get("exp"))
+    return user_id
+
 
 class JWTAuthMiddleware(BaseMiddleware):
     async def __call__(self, scope, receive, send):
@@ -29,10 +39,12 @@ class JWTAuthMiddleware(BaseMiddleware):
 
         if token:
             try:
-                payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-                user_id = payload.get("user_id")
-                user = await get_user(user_id)
-                if user:
+                user_id = resolve_token(token)
+                # Cache hits are served without a trip through the DB thread pool; like
+                # CachedJWTAuthentication, a user changed in another process may be
+                # served from the local copy for up to USER_CACHE_TTL seconds
+                user = user_cache.cached_user(user_id) or await get_user(user_id)
+                if user and user.is_active:
                     scope['user'] = user
             except jwt.ExpiredSignatureError:
                 pass
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# timeline.TIMELINE_MAX_LENGTH and TIMELINE_FANOUT_LIMIT when this migration was written
+TIMELINE_MAX_LENGTH = 500
+TIMELINE_FANOUT_LIMIT = 10000
+
+
+def backfill_timelines(apps, schema_editor):
+    """
+    Fill every subscriber's timeline with the newest posts of the creators
+    they follow, as timeline.backfill_creators does on subscribe. Posts of
+    creators past the fan-out limit are pulled at read time instead.
+    """
+    db = schema_editor.connection.alias
+    Post = apps.get_model('myapp', 'Post')
+    Subscription = apps.get_model('myapp', 'Subscription')
+    TimelineEntry = apps.get_model('myapp', 'TimelineEntry')
+
+    subscriptions = Subscription.objects.using(db)
+    large = set(
+        subscriptions.values('subscribed_to').annotate(n=models.Count('id'))
+        .filter(n__gt=TIMELINE_FANOUT_LIMIT).values_list('subscribed_to', flat=True)
+    )
+    creators = {}
+    for subscriber_id, creator_id in subscriptions.values_list('subscriber_id', 'subscribed_to_id'):
+        if creator_id not in large:
+            creators.setdefault(subscriber_id, []).append(creator_id)
+    for subscriber_id, creator_ids in creators.items():
+        recent = (
+            Post.objects.using(db).filter(user_id__in=creator_ids)
+            .order_by('-created_at', '-id').values_list('id', 'created_at')[:TIMELINE_MAX_LENGTH]
+        )
+        TimelineEntry.objects.using(db).bulk_create([
+            TimelineEntry(user_id=subscriber_id, post_id=post_id, created_at=created_at)
+            for post_id, created_at in recent
+        ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0004_alter_notification_unique_together'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='myapp.post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at', '-post'],
+                'indexes': [models.Index(fields=['user', '-created_at', '-post'], name='timeline_user_recent_idx')],
+                'unique_together': {('user', 'post')},
+            },
+        ),
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:24
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    Post = apps.get_model('myapp', 'Post')
+    Reaction = apps.get_model('myapp', 'Reaction')
+    Comment = apps.get_model('myapp', 'Comment')
+
+    def count_of(queryset):
+        counted = queryset.order_by().values('post').annotate(n=Count('id')).values('n')
+        return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+    Post.objects.update(
+        like_count=count_of(Reaction.objects.filter(post=OuterRef('pk'), reaction_type='like')),
+        dislike_count=count_of(Reaction.objects.filter(post=OuterRef('pk'), reaction_type='dislike')),
+        comment_count=count_of(Comment.objects.filter(post=OuterRef('pk'))),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0006_post_post_recent_idx_post_post_user_recent_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='dislike_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
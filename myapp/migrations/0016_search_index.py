@@ -0,0 +1,39 @@
+# Full-text search table (see myapp/search.py), SQLite only
+
+from django.db import migrations
+
+CREATE_SQL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS myapp_search USING fts5("
+    "kind UNINDEXED, object_id UNINDEXED, post_id UNINDEXED, author_id UNINDEXED, title, body, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_SQL)
+    schema_editor.execute(
+        "INSERT INTO myapp_search (rowid, kind, object_id, post_id, author_id, title, body) "
+        "SELECT id * 2, 'post', id, id, user_id, title, content FROM myapp_post"
+    )
+    schema_editor.execute(
+        "INSERT INTO myapp_search (rowid, kind, object_id, post_id, author_id, title, body) "
+        "SELECT id * 2 + 1, 'comment', id, post_id, user_id, '', content FROM myapp_comment"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS myapp_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0015_post_post_file_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
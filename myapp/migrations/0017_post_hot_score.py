@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:47
+
+from django.db import migrations, models
+
+from myapp.ranking import hot_score
+
+
+def populate_hot_scores(apps, schema_editor):
+    Post = apps.get_model('myapp', 'Post')
+    posts = [
+        Post(pk=pk, hot_score=hot_score(*counters))
+        for pk, *counters in Post.objects.values_list('pk', 'like_count', 'dislike_count', 'comment_count', 'created_at')
+    ]
+    Post.objects.bulk_update(posts, ['hot_score'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0016_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='hot_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-hot_score', '-id'], name='post_hot_idx'),
+        ),
+        migrations.RunPython(populate_hot_scores, migrations.RunPython.noop),
+    ]
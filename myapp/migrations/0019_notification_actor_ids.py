@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:10
+
+from django.db import migrations, models
+
+
+def copy_recent_actors(apps, schema_editor):
+    # older aggregates only know their sampled actors
+    Notification = apps.get_model('myapp', 'Notification')
+    rows = Notification.objects.filter(notification_type__in=['like', 'dislike', 'comment'], post__isnull=False)
+    for notification in rows.only('id', 'recent_actors').iterator():
+        if notification.recent_actors:
+            notification.actor_ids = [actor['id'] for actor in notification.recent_actors]
+            notification.save(update_fields=['actor_ids'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0018_notification_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='actor_ids',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(copy_recent_actors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:13
+
+from django.db import migrations, models
+
+
+def mark_finalized(apps, schema_editor):
+    Upload = apps.get_model('myapp', 'Upload')
+    Upload.objects.filter(blob__isnull=False).update(status='finalized')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0019_notification_actor_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='upload',
+            name='status',
+            field=models.CharField(choices=[('open', 'Open'), ('finalizing', 'Finalizing'), ('finalized', 'Finalized')], default='open', max_length=10),
+        ),
+        migrations.RunPython(mark_finalized, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0020_upload_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='upload',
+            name='status',
+            field=models.CharField(choices=[('open', 'Open'), ('appending', 'Appending'), ('finalizing', 'Finalizing'), ('finalized', 'Finalized')], default='open', max_length=10),
+        ),
+    ]
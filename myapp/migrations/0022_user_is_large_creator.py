@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:29
+
+from django.db import migrations, models
+
+# timeline.TIMELINE_FANOUT_LIMIT when this migration was written
+TIMELINE_FANOUT_LIMIT = 10000
+
+
+def flag_large_creators(apps, schema_editor):
+    db = schema_editor.connection.alias
+    Subscription = apps.get_model('myapp', 'Subscription')
+    User = apps.get_model('myapp', 'User')
+    large = (
+        Subscription.objects.using(db).values('subscribed_to').annotate(n=models.Count('id'))
+        .filter(n__gt=TIMELINE_FANOUT_LIMIT).values_list('subscribed_to', flat=True)
+    )
+    User.objects.using(db).filter(pk__in=list(large)).update(is_large_creator=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0021_upload_status_appending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='is_large_creator',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(flag_large_creators, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,12 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import BaseUserManager, AbstractBaseUser
 from django.conf import settings
+from django.utils import timezone
+from django.db.models.functions import Greatest, RowNumber
+
+from .ranking import hot_score
 
 # -------------------------------
 # User and User Manager
@@ -34,6 +40,8 @@ class User(AbstractBaseUser):
     is_admin = models.BooleanField(default=False)
     is_creator = models.BooleanField(default=False)
     is_viewer = models.BooleanField(default=True)
+    # too many subscribers to fan out to: posts are pulled into feeds at read time (timeline.py)
+    is_large_creator = models.BooleanField(default=False)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -81,13 +89,32 @@ class Post(models.Model):
     title = models.CharField(max_length=255, blank=True)
     content = models.TextField(blank=True)
     file = models.FileField(upload_to='uploads/', blank=True, null=True)
+    # Set when `file` points at a content-addressed blob from a chunked upload
+    blob = models.ForeignKey('MediaBlob', on_delete=models.SET_NULL, blank=True, null=True, related_name='posts')
+    # Resized/WebP copies of an image file, filled in by myapp/derivatives.py
+    media_variants = models.JSONField(default=dict, blank=True)
     post_type = models.CharField(max_length=10, choices=POST_TYPE_CHOICES, default='post')
 
+    # Denormalized counters, kept in sync with F() updates (see bump_counters)
+    like_count = models.PositiveIntegerField(default=0)
+    dislike_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    # Time-decayed engagement rank (see ranking.py), refreshed by bump_counters
+    hot_score = models.FloatField(default=0)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # keyset pagination over (created_at, id)
+            models.Index(fields=['-created_at', '-id'], name='post_recent_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='post_user_recent_idx'),
+            # media access checks look posts up by file (see media.py)
+            models.Index(fields=['file'], name='post_file_idx'),
+            models.Index(fields=['-hot_score', '-id'], name='post_hot_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.email} - {self.post_type} - {self.title or 'No Title'}"
@@ -99,6 +126,54 @@ class Post(models.Model):
         # Only followers can see if private
         return profile.followers.filter(pk=viewer.profile.pk).exists()
 
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.hot_score = hot_score(
+                self.like_count, self.dislike_count, self.comment_count, self.created_at or timezone.now(),
+            )
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def bump_counters(cls, post_id, **deltas):
+        """
+        Atomically add deltas to the stored counters,
+        e.g. Post.bump_counters(post.id, like_count=1, dislike_count=-1),
+        and refresh the post's hot score.
+        """
+        cls.apply_counter_deltas({post_id: deltas})
+
+    @classmethod
+    def apply_counter_deltas(cls, deltas_by_post):
+        """
+        bump_counters for many posts: {post_id: {field: delta}}. Posts with
+        the same deltas share one UPDATE, so a batch costs at most one
+        query per distinct combination plus the hot score refresh.
+        Counters never go below zero.
+        """
+        groups = {}
+        for post_id, deltas in deltas_by_post.items():
+            key = tuple(sorted((field, delta) for field, delta in deltas.items() if delta))
+            if key:
+                groups.setdefault(key, []).append(post_id)
+        for key, post_ids in groups.items():
+            cls.objects.filter(pk__in=post_ids).update(
+                **{field: Greatest(models.F(field) + delta, 0) for field, delta in key}
+            )
+        changed = [post_id for post_ids in groups.values() for post_id in post_ids]
+        if changed:
+            cls.update_hot_scores(changed)
+
+    @classmethod
+    def update_hot_scores(cls, post_ids):
+        """
+        Recompute hot_score from the stored counters.
+        """
+        rows = cls.objects.filter(pk__in=post_ids).values_list(
+            'pk', 'like_count', 'dislike_count', 'comment_count', 'created_at',
+        )
+        posts = [cls(pk=pk, hot_score=hot_score(*counters)) for pk, *counters in rows]
+        cls.objects.bulk_update(posts, ['hot_score'])
+
 
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
@@ -110,10 +185,34 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['post', 'created_at', 'id'], name='comment_post_thread_idx'),
+        ]
 
     def __str__(self):
         return f"Comment by {self.user.email} on {self.post.title or 'Post'}"
 
+    @classmethod
+    def attach_previews(cls, posts, limit):
+        """
+        Set `comment_preview` on each post to its `limit` most recent
+        comments, fetched for the whole page with one windowed query.
+        """
+        previews = {post.id: [] for post in posts}
+        if previews and limit > 0:
+            ranked = cls.objects.filter(post_id__in=previews).select_related('user').annotate(
+                rank=models.Window(
+                    RowNumber(),
+                    partition_by=[models.F('post_id')],
+                    order_by=[models.F('created_at').desc(), models.F('id').desc()],
+                )
+            ).filter(rank__lte=limit).order_by('post_id', '-created_at', '-id')
+            for comment in ranked:
+                previews[comment.post_id].append(comment)
+        for post in posts:
+            post.comment_preview = previews[post.id]
+        return posts
+
 
 class Reaction(models.Model):
     LIKE = 'like'
@@ -124,6 +223,12 @@ class Reaction(models.Model):
         (DISLIKE, 'Dislike'),
     ]
 
+    # Post counter column for each reaction type
+    COUNTER_FIELDS = {
+        LIKE: 'like_count',
+        DISLIKE: 'dislike_count',
+    }
+
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='reactions')
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     reaction_type = models.CharField(max_length=7, choices=REACTION_CHOICES)
@@ -138,19 +243,38 @@ class Reaction(models.Model):
 
     @staticmethod
     def count_reactions(post):
-        counts = {Reaction.LIKE: 0, Reaction.DISLIKE: 0}
-        reactions = post.reactions.values('reaction_type').annotate(count=models.Count('id'))
-        for r in reactions:
-            counts[r['reaction_type']] = r['count']
-        return counts
+        return {Reaction.LIKE: post.like_count, Reaction.DISLIKE: post.dislike_count}
 
     @classmethod
     def likes(cls, post):
-        return post.reactions.filter(reaction_type=cls.LIKE).count()
+        return post.like_count
 
     @classmethod
     def dislikes(cls, post):
-        return post.reactions.filter(reaction_type=cls.DISLIKE).count()
+        return post.dislike_count
+
+# -------------------------------
+# Timeline (fan-out-on-write feed)
+# -------------------------------
+class TimelineEntry(models.Model):
+    """
+    One post pushed into a subscriber's materialized home timeline.
+    `created_at` is copied from the post so the feed can be read
+    straight off the (user, created_at, post) index.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timeline_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-created_at', '-post']
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-post'], name='timeline_user_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} in timeline of user {self.user_id}"
 
 #-------------------------------
 #Notification Model
@@ -169,12 +293,22 @@ class Notification(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, blank=True, null=True, related_name='notifications')
     comment = models.ForeignKey(Comment, on_delete=models.CASCADE, blank=True, null=True, related_name='notifications')
     is_read = models.BooleanField(default=False)
+    # Coalesced notifications: how many people did this, and the most recent few of them
+    actor_count = models.PositiveIntegerField(default=1)
+    recent_actors = models.JSONField(default=list, blank=True)
+    # every distinct actor id folded in so far, so returning actors aren't counted twice
+    actor_ids = models.JSONField(default=list, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # bumped when an aggregate absorbs more actors, so clients can resume from it (see consumers.py)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
         # Prevent duplicate notifications
         unique_together = [['sender', 'receiver', 'notification_type', 'post', 'comment']]
+        indexes = [
+            models.Index(fields=['receiver', 'notification_type', 'post', '-created_at'], name='notification_coalesce_idx'),
+        ]
 
     def __str__(self):
         return f"Notification from {self.sender.email} to {self.receiver.email} ({self.notification_type})"
@@ -192,6 +326,8 @@ class Notification(models.Model):
             "notification_type": self.notification_type,
             "post_id": self.post_id,
             "comment_id": self.comment_id,
+            "actor_count": self.actor_count,
+            "recent_actors": self.recent_actors,
             "is_read": self.is_read,
             "created_at": self.created_at.isoformat(),
         }
@@ -210,3 +346,134 @@ class Notification(models.Model):
         }
         
         return messages.get(self.notification_type, "New notification")
+
+
+class NotificationReadMarker(models.Model):
+    """
+    Per-user read watermark: every notification with id <= last_read_id is
+    read. Notification.is_read is only needed for items above it.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='notification_read_marker')
+    last_read_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"User {self.user_id} read notifications up to {self.last_read_id}"
+
+
+# -------------------------------
+# Notification Outbox
+# -------------------------------
+class NotificationOutbox(models.Model):
+    """
+    A notification waiting to be stored and pushed. Rows are written in the
+    same transaction as the Reaction/Comment/Subscription that caused them
+    and drained in batches by the dispatcher (myapp/outbox.py).
+    """
+    sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    receiver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    notification_type = models.CharField(max_length=10)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, blank=True, null=True, related_name='+')
+    comment = models.ForeignKey(Comment, on_delete=models.CASCADE, blank=True, null=True, related_name='+')
+    payload = models.JSONField()
+
+    stored = models.BooleanField(default=False)
+    # set by the dispatcher that is storing and pushing this event
+    claimed_by = models.CharField(max_length=32, blank=True)
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['available_at', 'id'], name='outbox_available_idx'),
+        ]
+
+    def __str__(self):
+        return f"Outbox {self.notification_type} for user {self.receiver_id} (attempts: {self.attempts})"
+
+
+# -------------------------------
+# New-post notification fan-out
+# -------------------------------
+class PostFanout(models.Model):
+    """
+    Progress of notifying a creator's subscribers about a new post.
+    The worker (myapp/fanout.py) pages through subscriptions by id and
+    records the last one handled with each chunk, so a crashed run
+    resumes where it stopped.
+    """
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, related_name='fanout')
+    last_subscription_id = models.BigIntegerField(default=0)
+    notified = models.PositiveIntegerField(default=0)
+    completed_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        state = 'done' if self.completed_at else f'at subscription {self.last_subscription_id}'
+        return f"Fan-out of post {self.post_id} ({self.notified} notified, {state})"
+
+
+# -------------------------------
+# Media uploads
+# -------------------------------
+class MediaBlob(models.Model):
+    """
+    Stored file content, addressed by its SHA-256. Uploads of the same
+    bytes share one blob; posts point their `file` at `blob.file`.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    size = models.PositiveBigIntegerField()
+    content_type = models.CharField(max_length=100, blank=True)
+    file = models.FileField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Blob {self.sha256} ({self.size} bytes)"
+
+
+class Upload(models.Model):
+    """
+    A chunked, resumable upload (see myapp/uploads.py). Chunks are
+    appended to a partial file at `offset`; finalizing hashes it and
+    links the resulting blob.
+    """
+    OPEN = 'open'
+    APPENDING = 'appending'
+    FINALIZING = 'finalizing'
+    FINALIZED = 'finalized'
+
+    STATUS_CHOICES = [
+        (OPEN, 'Open'),
+        (APPENDING, 'Appending'),
+        (FINALIZING, 'Finalizing'),
+        (FINALIZED, 'Finalized'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='uploads')
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True)
+    size = models.PositiveBigIntegerField(blank=True, null=True)  # declared total, if known
+    offset = models.PositiveBigIntegerField(default=0)
+    blob = models.ForeignKey(MediaBlob, on_delete=models.SET_NULL, blank=True, null=True, related_name='uploads')
+    # open -> appending/finalizing with a conditional update before the partial file is touched,
+    # so only one request at a time appends to or finalizes an upload
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=OPEN)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        state = 'finalized' if self.blob_id else f'{self.offset} bytes received'
+        return f"Upload {self.id} of {self.filename} ({state})"
+
+    @property
+    def finalized(self):
+        return self.blob_id is not None
@@ -0,0 +1,419 @@
+"""
+Notification outbox dispatcher.
+
+Signal handlers only insert NotificationOutbox rows inside the writing
+transaction. The dispatcher drains them in batches: one bulk_create for the
+Notification rows, then the websocket pushes for the whole batch sent
+concurrently over the channel layer. Failed pushes are retried with
+exponential backoff until OUTBOX_MAX_ATTEMPTS is reached.
+
+Events of a coalescable type for the same post are merged into one
+aggregate notification per NOTIFICATION_COALESCE_WINDOW ("Alice and 312
+others liked your post") and pushed once per batch.
+
+Each dispatcher claims its batch with a conditional UPDATE (claimed_by,
+claimed_at) before storing anything, so the worker and an inline dispatch
+never store or push the same events twice. A claim older than
+OUTBOX_CLAIM_TIMEOUT, left by a dispatcher that died, is taken over.
+
+Pushes are built from the stored rows (notification_frame), so every
+frame carries the notification id and updated_at a client resumes from,
+and live frames look the same as replayed ones (see consumers.py).
+"""
+import asyncio
+import logging
+import uuid
+from datetime import timedelta, timezone as dt_timezone
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Min, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Notification, NotificationOutbox
+from .unread import incr_unread, read_watermarks
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = getattr(settings, 'OUTBOX_BATCH_SIZE', 200)
+OUTBOX_MAX_ATTEMPTS = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 5)
+OUTBOX_RETRY_BACKOFF = getattr(settings, 'OUTBOX_RETRY_BACKOFF', 2)
+OUTBOX_BACKLOG_WARNING = getattr(settings, 'OUTBOX_BACKLOG_WARNING', 10000)
+OUTBOX_CLAIM_TIMEOUT = getattr(settings, 'OUTBOX_CLAIM_TIMEOUT', 60)
+
+NOTIFICATION_COALESCE_WINDOW = getattr(settings, 'NOTIFICATION_COALESCE_WINDOW', 60)
+NOTIFICATION_COALESCE_TYPES = getattr(settings, 'NOTIFICATION_COALESCE_TYPES', ['like', 'dislike', 'comment'])
+NOTIFICATION_ACTOR_SAMPLE_SIZE = getattr(settings, 'NOTIFICATION_ACTOR_SAMPLE_SIZE', 5)
+
+COALESCED_VERBS = {
+    'like': 'liked',
+    'dislike': 'disliked',
+    'comment': 'commented on',
+}
+
+
+def build_payload(notif_type, instance, sender_user):
+    """
+    Build the real-time notification payload pushed over Channels.
+    """
+    # Build dynamic message based on notification type
+    if notif_type == "like":
+        message = f"{sender_user.name} liked your post (ID: {instance.post_id})"
+    elif notif_type == "dislike":
+        message = f"{sender_user.name} disliked your post (ID: {instance.post_id})"
+    elif notif_type == "comment":
+        message = f"{sender_user.name} commented on your post (ID: {instance.post_id}): \"{instance.content}\""
+    elif notif_type == "follow":
+        message = f"{sender_user.name} subscribed to you"
+    elif notif_type == "post":
+        message = f"{sender_user.name} posted something new (ID: {instance.post_id})"
+    else:
+        message = f"New {notif_type} from {sender_user.name}"
+
+    return {
+        "type": notif_type,
+        "sender": {
+            "id": sender_user.id,
+            "username": sender_user.name,
+        },
+        "message": message,
+        "post_id": getattr(instance, "post_id", None),
+        "comment_id": getattr(instance, "id", None) if notif_type == "comment" else None
+    }
+
+
+def cursor_time(value):
+    """
+    A timestamp as clients send it back in ?updated_since=: UTC, with a
+    Z suffix so it survives a query string unescaped.
+    """
+    return value.astimezone(dt_timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def parse_cursor_time(value):
+    try:
+        parsed = parse_datetime(str(value)) if value else None
+    except ValueError:
+        return None
+    return parsed if parsed is not None and parsed.tzinfo is not None else None
+
+
+def notification_frame(notification, payload):
+    """
+    The websocket frame for a stored notification, live or replayed:
+    `payload` (see build_payload) plus the notification's id, timestamps
+    and actors, with the message of an aggregate rewritten for its
+    latest actor.
+    """
+    frame = dict(payload)
+    frame.update({
+        "id": notification.pk,
+        "created_at": cursor_time(notification.created_at),
+        "updated_at": cursor_time(notification.updated_at),
+        "is_read": notification.is_read,
+        "actor_count": notification.actor_count,
+        "recent_actors": notification.recent_actors,
+    })
+    notification_type, post_id = notification.notification_type, notification.post_id
+    if NOTIFICATION_COALESCE_WINDOW and post_id and notification_type in NOTIFICATION_COALESCE_TYPES:
+        frame["coalesce_key"] = f"{notification_type}:{post_id}"
+    if notification.actor_count > 1 and notification.recent_actors:
+        latest = notification.recent_actors[0]
+        others = notification.actor_count - 1
+        frame["sender"] = {"id": latest["id"], "username": latest["name"]}
+        frame["message"] = (
+            f"{latest['name']} and {others} other{'s' if others > 1 else ''} "
+            f"{COALESCED_VERBS.get(notification_type, notification_type)} your post (ID: {post_id})"
+        )
+    return frame
+
+
+def replay_frame(notification):
+    """
+    notification_frame for a row loaded with select_related('sender', 'comment').
+    """
+    instance = notification.comment if notification.comment_id else notification
+    return notification_frame(notification, build_payload(notification.notification_type, instance, notification.sender))
+
+
+def pending_events():
+    return NotificationOutbox.objects.filter(attempts__lt=OUTBOX_MAX_ATTEMPTS)
+
+
+def outbox_stats():
+    """
+    Backpressure metrics: how much is queued, how far behind the
+    dispatcher is, and how many events have exhausted their retries.
+    """
+    now = timezone.now()
+    pending = pending_events()
+    oldest = pending.aggregate(oldest=Min('created_at'))['oldest']
+    return {
+        'pending': pending.count(),
+        'ready': pending.filter(available_at__lte=now).count(),
+        'dead': NotificationOutbox.objects.filter(attempts__gte=OUTBOX_MAX_ATTEMPTS).count(),
+        'lag_seconds': (now - oldest).total_seconds() if oldest else 0.0,
+    }
+
+
+def coalesce_key(event):
+    """
+    (receiver, type, post) for events that are merged into an aggregate
+    notification, None for events stored one row each.
+    """
+    if NOTIFICATION_COALESCE_WINDOW and event.post_id and event.notification_type in NOTIFICATION_COALESCE_TYPES:
+        return (event.receiver_id, event.notification_type, event.post_id)
+    return None
+
+
+def _merge_into_aggregate(key, group, now, watermark):
+    """
+    Fold a group of events into the unread aggregate notification of the
+    current window, creating it if the window has none yet.
+    Returns (created, aggregate).
+    """
+    receiver_id, notification_type, post_id = key
+    actors = []
+    for event in reversed(group):
+        actor = {'id': event.sender_id, 'name': event.payload['sender']['username']}
+        if actor not in actors:
+            actors.append(actor)
+
+    aggregate = Notification.objects.filter(
+        receiver_id=receiver_id,
+        notification_type=notification_type,
+        post_id=post_id,
+        created_at__gte=now - timedelta(seconds=NOTIFICATION_COALESCE_WINDOW),
+        id__gt=watermark,
+        is_read=False,
+    ).order_by('-created_at').first()
+
+    if aggregate is None:
+        latest = group[-1]
+        return True, Notification.objects.create(
+            sender_id=latest.sender_id,
+            receiver_id=receiver_id,
+            notification_type=notification_type,
+            post_id=post_id,
+            comment_id=latest.comment_id,
+            actor_count=len(actors),
+            recent_actors=actors[:NOTIFICATION_ACTOR_SAMPLE_SIZE],
+            actor_ids=[actor['id'] for actor in actors],
+        )
+
+    known = set(aggregate.actor_ids)
+    new_actors = [actor for actor in actors if actor['id'] not in known]
+    aggregate.actor_count += len(new_actors)
+    aggregate.actor_ids += [actor['id'] for actor in new_actors]
+    aggregate.recent_actors = (new_actors + aggregate.recent_actors)[:NOTIFICATION_ACTOR_SAMPLE_SIZE]
+    aggregate.save(update_fields=['actor_count', 'recent_actors', 'actor_ids', 'updated_at'])
+    return False, aggregate
+
+
+def _find_aggregate(key):
+    """
+    The latest stored notification for a coalesce key.
+    """
+    receiver_id, notification_type, post_id = key
+    return Notification.objects.filter(
+        receiver_id=receiver_id, notification_type=notification_type, post_id=post_id,
+    ).order_by('-updated_at', '-id').first()
+
+
+def _unique_key(row):
+    return (row.sender_id, row.receiver_id, row.notification_type, row.post_id, row.comment_id)
+
+
+def _find_notifications(events):
+    """
+    {unique key: Notification} stored for single events, in one query.
+    """
+    if not events:
+        return {}
+    keys = {_unique_key(event) for event in events}
+    rows = Notification.objects.filter(
+        receiver_id__in={event.receiver_id for event in events},
+        sender_id__in={event.sender_id for event in events},
+        notification_type__in={event.notification_type for event in events},
+    )
+    return {key: row for row in rows if (key := _unique_key(row)) in keys}
+
+
+def _group_events(events):
+    groups = {}
+    singles = []
+    for event in events:
+        key = coalesce_key(event)
+        if key is None:
+            singles.append(event)
+        else:
+            groups.setdefault(key, []).append(event)
+    return singles, groups
+
+
+def _store_notifications(events):
+    """
+    Create Notification rows for events that have not been stored yet.
+    Events are marked stored in the same transaction, and a batch is only
+    ever held by one dispatcher, so an event is stored at most once. (The
+    unique_together on Notification is no guard here: NULL post/comment
+    ids never conflict.)
+    Returns the aggregate notification for each coalesced group.
+    """
+    unstored = [event for event in events if not event.stored]
+    if not unstored:
+        return {}
+    singles, groups = _group_events(unstored)
+    now = timezone.now()
+    with transaction.atomic():
+        # ignore_conflicts doesn't report which rows it skipped, so leave out the
+        # stored ones up front and only count what is actually inserted as unread
+        existing = _find_notifications(singles)
+        new = {}
+        for event in singles:
+            key = _unique_key(event)
+            if key not in existing:
+                new.setdefault(key, event)
+        Notification.objects.bulk_create(
+            [
+                Notification(
+                    sender_id=event.sender_id,
+                    receiver_id=event.receiver_id,
+                    notification_type=event.notification_type,
+                    post_id=event.post_id,
+                    comment_id=event.comment_id,
+                )
+                for event in new.values()
+            ],
+            ignore_conflicts=True,
+        )
+        unread = {}
+        for event in new.values():
+            unread[event.receiver_id] = unread.get(event.receiver_id, 0) + 1
+        aggregates = {}
+        watermarks = read_watermarks({key[0] for key in groups})
+        for key, group in groups.items():
+            created, aggregates[key] = _merge_into_aggregate(key, group, now, watermarks[key[0]])
+            if created:
+                unread[key[0]] = unread.get(key[0], 0) + 1
+        NotificationOutbox.objects.filter(pk__in=[event.pk for event in unstored]).update(stored=True)
+        transaction.on_commit(lambda: incr_unread(unread))
+    return aggregates
+
+
+def _plan_pushes(events, aggregates):
+    """
+    One push per single event and one per coalesced group, each paired
+    with the outbox events it delivers. Events stored by an earlier,
+    failed attempt are looked up again.
+    """
+    singles, groups = _group_events(events)
+    stored = _find_notifications(singles)
+    pushes = []
+    for event in singles:
+        notification = stored.get(_unique_key(event))
+        payload = notification_frame(notification, event.payload) if notification else event.payload
+        pushes.append((event.receiver_id, payload, [event]))
+    for key, group in groups.items():
+        aggregate = aggregates.get(key) or _find_aggregate(key)
+        payload = notification_frame(aggregate, group[-1].payload) if aggregate else group[-1].payload
+        pushes.append((key[0], payload, group))
+    return pushes
+
+
+async def _push_all(pushes):
+    channel_layer = get_channel_layer()
+    return await asyncio.gather(
+        *[
+            channel_layer.group_send(f"user_{receiver_id}", {
+                "type": "send_notification",
+                "notification": payload,
+            })
+            for receiver_id, payload, _ in pushes
+        ],
+        return_exceptions=True,
+    )
+
+
+def claim_batch(batch_size, now):
+    """
+    Claim up to `batch_size` ready events that no other dispatcher holds.
+    Returns (claim token, events claimed).
+    """
+    token = uuid.uuid4().hex
+    unclaimed = Q(claimed_at__isnull=True) | Q(claimed_at__lt=now - timedelta(seconds=OUTBOX_CLAIM_TIMEOUT))
+    ready = pending_events().filter(unclaimed, available_at__lte=now)
+    ids = list(ready.order_by('id').values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return token, []
+    # re-checked by the UPDATE, so of two dispatchers selecting the same ids only one claims each
+    ready.filter(pk__in=ids).update(claimed_by=token, claimed_at=now)
+    return token, list(NotificationOutbox.objects.filter(claimed_by=token).order_by('id'))
+
+
+def release_claim(token):
+    NotificationOutbox.objects.filter(claimed_by=token).update(claimed_by='', claimed_at=None)
+
+
+def dispatch_batch(batch_size=OUTBOX_BATCH_SIZE):
+    """
+    Claim, store and push one batch of ready events.
+    Returns (delivered, failed).
+    """
+    now = timezone.now()
+    token, events = claim_batch(batch_size, now)
+    if not events:
+        return 0, 0
+
+    try:
+        aggregates = _store_notifications(events)
+        pushes = _plan_pushes(events, aggregates)
+        results = async_to_sync(_push_all)(pushes)
+    except BaseException:
+        release_claim(token)
+        raise
+    delivered = []
+    failed = []
+    for (_, _, push_events), result in zip(pushes, results):
+        if isinstance(result, BaseException):
+            failed.extend((event, result) for event in push_events)
+        else:
+            delivered.extend(event.pk for event in push_events)
+
+    NotificationOutbox.objects.filter(pk__in=delivered).delete()
+    for event, error in failed:
+        delay = OUTBOX_RETRY_BACKOFF ** (event.attempts + 1)
+        NotificationOutbox.objects.filter(pk=event.pk).update(
+            attempts=F('attempts') + 1,
+            available_at=now + timedelta(seconds=delay),
+            last_error=repr(error)[:1000],
+            claimed_by='',
+            claimed_at=None,
+        )
+        logger.warning("Outbox push for event %s failed (attempt %s): %r", event.pk, event.attempts + 1, error)
+
+    return len(delivered), len(failed)
+
+
+def drain(batch_size=OUTBOX_BATCH_SIZE):
+    """
+    Dispatch until no ready events remain or a batch fails entirely.
+    """
+    delivered = failed = 0
+    while True:
+        batch_delivered, batch_failed = dispatch_batch(batch_size)
+        delivered += batch_delivered
+        failed += batch_failed
+        if not batch_delivered:
+            return delivered, failed
+
+
+def schedule_inline_dispatch():
+    """
+    Development convenience: drain right after the current transaction
+    commits instead of waiting for the dispatch_notifications worker.
+    """
+    transaction.on_commit(drain)
@@ -0,0 +1,80 @@
+"""
+Keyset (cursor) pagination helpers.
+
+Cursors are opaque url-safe tokens wrapping the (created_at, id) position
+of the last row a client has seen, so fetching the next page is an index
+range scan instead of an OFFSET that grows with scroll depth.
+"""
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class CursorError(ValueError):
+    pass
+
+
+def encode_cursor(data):
+    raw = json.dumps(data, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise CursorError("Invalid cursor")
+    if not isinstance(data, dict):
+        raise CursorError("Invalid cursor")
+    if 't' in data:
+        created_at = parse_datetime(str(data['t']))
+        if created_at is None or not isinstance(data.get('id'), int):
+            raise CursorError("Invalid cursor")
+        data['t'] = created_at
+    if 'h' in data and not (isinstance(data['h'], (int, float)) and isinstance(data.get('id'), int)):
+        raise CursorError("Invalid cursor")
+    return data
+
+
+def position_of(created_at, pk):
+    return {'t': created_at.isoformat(), 'id': pk}
+
+
+def page_params(request, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """
+    Read `cursor` and `limit` from the query string.
+    Returns (decoded cursor or None, limit).
+    """
+    cursor = request.query_params.get('cursor')
+    try:
+        limit = int(request.query_params.get('limit', default))
+    except ValueError:
+        raise CursorError("limit must be an integer")
+    limit = max(1, min(limit, maximum))
+    return (decode_cursor(cursor) if cursor else None), limit
+
+
+def keyset_filter(queryset, after=None, field='created_at', id_field='id', descending=True, key='t'):
+    """
+    Order newest first (oldest first with descending=False) and, when
+    `after` holds a decoded position, keep only rows past it. `key` is
+    the cursor entry holding the `field` value.
+    """
+    if descending:
+        queryset = queryset.order_by(f'-{field}', f'-{id_field}')
+        op = 'lt'
+    else:
+        queryset = queryset.order_by(field, id_field)
+        op = 'gt'
+    if after and key in after:
+        queryset = queryset.filter(
+            Q(**{f'{field}__{op}': after[key]}) |
+            Q(**{field: after[key], f'{id_field}__{op}': after['id']})
+        )
+    return queryset
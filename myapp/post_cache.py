@@ -0,0 +1,186 @@
+"""
+Read-through cache for post lists and rendered posts.
+
+Entries are keyed by a version number instead of being deleted on write:
+- every post has a version, bumped when the post, its comments or its
+  reactions change; rendered feed items are cached per post version
+- every creator has a version, bumped when one of their posts is created,
+  edited or deleted; their post list (CreatorPost.get) is cached per version
+- the site-wide "recent" version, bumped on any post create/edit/delete,
+  covers the index of top-ranked posts used by the feed's recent section
+
+- every user has a subscriptions version, bumped when they subscribe or
+  unsubscribe (used by the feed's conditional GET validators)
+
+Invalidation is therefore one cache write per scope with no key scanning;
+stale entries are simply never read again and expire after
+POST_CACHE_TIMEOUT. Versions are the time of the change in nanoseconds, so
+a version that was evicted is recreated from the clock and can never match
+an entry written under the old value, and they also count toward
+Last-Modified for changes that leave updated_at alone (counters, comments).
+"""
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+
+from .models import Post
+
+POST_CACHE_TIMEOUT = getattr(settings, 'POST_CACHE_TIMEOUT', 300)
+RECENT_POSTS_CACHE_SIZE = getattr(settings, 'RECENT_POSTS_CACHE_SIZE', 200)
+HOT_INDEX_TTL = getattr(settings, 'HOT_INDEX_TTL', 30)
+
+
+def version_key(scope, ident=''):
+    return f"posts:v:{scope}:{ident}"
+
+
+def get_versions(keys):
+    """
+    Current value of each version key, creating missing ones.
+    """
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return versions
+
+
+def last_modified(posts, versions=()):
+    """
+    The newest of the `posts` queryset's updated_at and the change times in
+    `versions`, or None when there is neither.
+    """
+    times = [datetime.fromtimestamp(version / 1e9, dt_timezone.utc) for version in versions]
+    newest = posts.aggregate(newest=Max('updated_at'))['newest']
+    if newest:
+        times.append(newest)
+    return max(times, default=None)
+
+
+def bump(*keys):
+    now = time.time_ns()
+    cache.set_many({key: now for key in keys}, None)
+
+
+def _bump_on_commit(*keys):
+    # after commit, so a reader can't re-cache the old rows under the new version
+    transaction.on_commit(lambda: bump(*keys))
+
+
+def post_changed(post_id):
+    """
+    A comment or reaction on the post changed.
+    """
+    _bump_on_commit(version_key('post', post_id))
+
+
+def posts_changed(post_ids):
+    _bump_on_commit(*[version_key('post', post_id) for post_id in set(post_ids)])
+
+
+def subscriptions_changed(user_id):
+    _bump_on_commit(version_key('subscriptions', user_id))
+
+
+def creator_post_changed(post_id, creator_id):
+    """
+    A post was created, edited or deleted.
+    """
+    _bump_on_commit(version_key('post', post_id), version_key('creator', creator_id), version_key('recent'))
+
+
+def render_posts(post_ids, serializer_class, loaded=None, prepare=None, versions=None):
+    """
+    Serialized data for `post_ids` (in order), reusing cached renders of
+    each post at its current version. Only posts that miss are loaded,
+    taken from `loaded` (id -> Post) when given; `prepare` is called with
+    them before they are serialized (e.g. to attach comment previews).
+    Pass `versions` when they were already read from get_versions.
+    Ids of posts that no longer exist are skipped.
+    """
+    name = serializer_class.__name__
+    if versions is None:
+        versions = get_versions([version_key('post', post_id) for post_id in post_ids])
+    keys = {
+        post_id: f"posts:item:{name}:{post_id}:{versions[version_key('post', post_id)]}"
+        for post_id in post_ids
+    }
+    cached = cache.get_many(list(keys.values()))
+
+    missing_ids = [post_id for post_id in post_ids if keys[post_id] not in cached]
+    if missing_ids:
+        loaded = loaded or {}
+        missing = [loaded[post_id] for post_id in missing_ids if post_id in loaded]
+        to_load = [post_id for post_id in missing_ids if post_id not in loaded]
+        if to_load:
+            missing += Post.objects.filter(pk__in=to_load)
+        if prepare:
+            prepare(missing)
+        rendered = serializer_class(missing, many=True).data
+        fresh = {keys[post.id]: dict(data) for post, data in zip(missing, rendered)}
+        cache.set_many(fresh, POST_CACHE_TIMEOUT)
+        cached.update(fresh)
+    return [cached[keys[post_id]] for post_id in post_ids if keys[post_id] in cached]
+
+
+def hot_index():
+    """
+    (hot_score, id, user_id) of the RECENT_POSTS_CACHE_SIZE hottest posts,
+    best first, read off the hot_score index. The feed's recent section
+    pages through this in memory and only queries the table once a client
+    scrolls past its end. Scores move with every reaction, so the index is
+    rebuilt every HOT_INDEX_TTL seconds as well as on post writes.
+    """
+    version = get_versions([version_key('recent')])[version_key('recent')]
+    key = f"posts:hot:{version}"
+    index = cache.get(key)
+    if index is None:
+        index = list(
+            Post.objects.order_by('-hot_score', '-id').values_list('hot_score', 'id', 'user_id')[:RECENT_POSTS_CACHE_SIZE]
+        )
+        cache.set(key, index, HOT_INDEX_TTL)
+    return index
+
+
+def hot_posts(exclude_user_ids, after, limit):
+    """
+    (hot_score, id) of up to `limit` posts ranked below `after` (a decoded
+    cursor position) not written by `exclude_user_ids`, from the cached index.
+    Returns None when the index can't answer, i.e. it holds fewer
+    matches than asked for and lower-ranked posts may exist.
+    """
+    index = hot_index()
+    position = (after['h'], after['id']) if after and 'h' in after else None
+    found = []
+    for score, post_id, user_id in index:
+        if position and (score, post_id) >= position:
+            continue
+        if user_id in exclude_user_ids:
+            continue
+        found.append((score, post_id))
+        if len(found) == limit:
+            return found
+    return found if len(index) < RECENT_POSTS_CACHE_SIZE else None
+
+
+def creator_version(creator_id):
+    return get_versions([version_key('creator', creator_id)])[version_key('creator', creator_id)]
+
+
+def creator_posts(creator_id, serializer_class, version=None):
+    """
+    Serialized posts of a creator, newest first.
+    """
+    if version is None:
+        version = creator_version(creator_id)
+    key = f"posts:creator:{serializer_class.__name__}:{creator_id}:{version}"
+    data = cache.get(key)
+    if data is None:
+        data = list(serializer_class(Post.objects.filter(user_id=creator_id), many=True).data)
+        cache.set(key, data, POST_CACHE_TIMEOUT)
+    return data
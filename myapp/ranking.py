@@ -0,0 +1,34 @@
+"""
+Hot score for ranking the feed's recent section.
+
+    hot = sign(e) * log2(1 + |e|) + (created_at - HOT_EPOCH) / HOT_HALF_LIFE
+    e   = likes * HOT_LIKE_WEIGHT + comments * HOT_COMMENT_WEIGHT - dislikes * HOT_DISLIKE_WEIGHT
+
+A post HOT_HALF_LIFE seconds newer scores as much as one with twice the
+engagement, so ordering by `hot` is the same as ordering by engagement
+decayed by half every HOT_HALF_LIFE. Because the age term is fixed at
+creation, a score only changes when the post's counters do: it is
+recomputed on reaction and comment writes (Post.bump_counters) and never
+has to be re-decayed over time.
+"""
+import math
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+HOT_LIKE_WEIGHT = getattr(settings, 'HOT_LIKE_WEIGHT', 1.0)
+HOT_COMMENT_WEIGHT = getattr(settings, 'HOT_COMMENT_WEIGHT', 2.0)
+HOT_DISLIKE_WEIGHT = getattr(settings, 'HOT_DISLIKE_WEIGHT', 1.0)
+HOT_HALF_LIFE = getattr(settings, 'HOT_HALF_LIFE', 12 * 60 * 60)
+
+HOT_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def hot_score(like_count, dislike_count, comment_count, created_at):
+    engagement = (
+        like_count * HOT_LIKE_WEIGHT + comment_count * HOT_COMMENT_WEIGHT - dislike_count * HOT_DISLIKE_WEIGHT
+    )
+    return (
+        math.copysign(math.log2(1 + abs(engagement)), engagement)
+        + (created_at - HOT_EPOCH).total_seconds() / HOT_HALF_LIFE
+    )
@@ -0,0 +1,284 @@
+"""
+Write-behind buffer for reactions.
+
+With REACTION_WRITE_BEHIND on, reaction writes don't touch the database
+in the request. The wanted state of each (post, user) pair is kept in a
+per-process buffer, the last write winning, and a background thread
+writes the whole buffer every REACTION_FLUSH_INTERVAL seconds (sooner
+once it holds REACTION_BUFFER_MAX_ENTRIES pairs) with
+reactions.apply_changes: one transaction with a bulk upsert, a bulk
+delete and one counter update per distinct delta. A burst of likes on
+one post becomes one short write per interval instead of a locked
+transaction per like.
+
+Each entry remembers the pair's state in the table when it was first
+buffered, so the pending counter deltas per post are kept without
+queries, and reads (reaction_state, merge_counts) add them to the
+table's counters. The buffer is per process: with several workers a
+worker sees its own pending reactions at once and the others' after
+their next flush. Pending reactions are flushed when the process exits
+normally and lost if it is killed.
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections
+
+from .models import Post, Reaction
+from .reactions import SET, apply_changes, batch_results, change_status, parse_batch
+
+logger = logging.getLogger(__name__)
+
+REACTION_WRITE_BEHIND = getattr(settings, 'REACTION_WRITE_BEHIND', False)
+REACTION_FLUSH_INTERVAL = getattr(settings, 'REACTION_FLUSH_INTERVAL', 1.0)
+REACTION_BUFFER_MAX_ENTRIES = getattr(settings, 'REACTION_BUFFER_MAX_ENTRIES', 10000)
+
+
+def _counter_deltas(wanted, stored):
+    deltas = {}
+    if stored is not None:
+        deltas[Reaction.COUNTER_FIELDS[stored]] = -1
+    if wanted is not None:
+        field = Reaction.COUNTER_FIELDS[wanted]
+        deltas[field] = deltas.get(field, 0) + 1
+    return deltas
+
+
+class ReactionBuffer:
+    """
+    Thread-safe map of (post_id, user_id) -> [wanted, stored], where
+    `wanted` is the reaction type to write (None to remove) and `stored`
+    what the table held when the pair was buffered.
+    """
+
+    def __init__(self, flush_interval=REACTION_FLUSH_INTERVAL, max_entries=REACTION_BUFFER_MAX_ENTRIES):
+        self.flush_interval = flush_interval
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._worker = None
+        self._entries = {}
+        self._flushing = {}  # entries being written by flush(), still visible to reads
+        self._users = {}     # user_id -> User, senders of notifications
+        self._pending = {}   # post_id -> {counter field: delta} for everything not yet committed
+        self.recorded = self.flushed = self.dropped = self.flushes = 0
+
+    def _add_pending(self, post_id, wanted, stored, sign):
+        pending = self._pending.setdefault(post_id, {})
+        for field, delta in _counter_deltas(wanted, stored).items():
+            pending[field] = pending.get(field, 0) + sign * delta
+            if not pending[field]:
+                del pending[field]
+        if not pending:
+            del self._pending[post_id]
+
+    def lookup(self, user_id, post_ids):
+        """
+        {post_id: wanted} for the user's buffered reactions among `post_ids`.
+        """
+        with self._lock:
+            found = {}
+            for post_id in post_ids:
+                entry = self._entries.get((post_id, user_id)) or self._flushing.get((post_id, user_id))
+                if entry is not None:
+                    found[post_id] = entry[0]
+            return found
+
+    def pending(self, post_ids):
+        """
+        {post_id: {counter field: delta}} not yet in the table's counters.
+        """
+        with self._lock:
+            return {post_id: dict(self._pending[post_id]) for post_id in post_ids if post_id in self._pending}
+
+    def record(self, post_id, user, wanted, stored):
+        """
+        Buffer `wanted` for (post_id, user). `stored` is the table's
+        current reaction, used only if the pair isn't buffered yet.
+        """
+        key = (post_id, user.id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._add_pending(post_id, entry[0], entry[1], -1)
+                stored = entry[1]
+            elif key in self._flushing:
+                # the table will hold the flushing state once that commits
+                stored = self._flushing[key][0]
+            self._entries[key] = [wanted, stored]
+            self._add_pending(post_id, wanted, stored, 1)
+            self._users[user.id] = user
+            self.recorded += 1
+            full = len(self._entries) >= self.max_entries
+        self._start_worker()
+        if full:
+            self._wake.set()
+
+    def _write(self, changes, users):
+        """
+        apply_changes, falling back to one pair at a time when the batch
+        violates a constraint, so one bad pair can't block the rest.
+        Returns the pairs that couldn't be written.
+        """
+        try:
+            apply_changes(changes, users)
+            return []
+        except IntegrityError:
+            logger.warning("Batch of %s buffered reactions failed, writing them one by one", len(changes))
+        dropped = []
+        for key, wanted in changes.items():
+            try:
+                apply_changes({key: wanted}, users)
+            except IntegrityError:
+                logger.exception("Dropping buffered reaction %s of user %s", wanted, key[1])
+                dropped.append(key)
+        return dropped
+
+    def flush(self):
+        """
+        Write everything buffered so far. Returns the number of pairs
+        written. Pairs that violate a constraint (e.g. their user was
+        deleted) are dropped; on any other error, such as the database
+        being locked, the entries are put back and the error raised.
+        """
+        with self._flush_lock:
+            with self._lock:
+                self._flushing, self._entries = self._entries, {}
+                users, self._users = self._users, {}
+                flushing = self._flushing
+            if not flushing:
+                return 0
+            try:
+                dropped = self._write({key: wanted for key, (wanted, _) in flushing.items()}, users)
+            except Exception:
+                with self._lock:
+                    for key, (wanted, stored) in flushing.items():
+                        entry = self._entries.get(key)
+                        if entry is None:
+                            self._entries[key] = [wanted, stored]
+                        else:
+                            # recorded again meanwhile: the newer state wins, the table still holds `stored`
+                            entry[1] = stored
+                    self._users = {**users, **self._users}
+                    self._flushing = {}
+                raise
+            with self._lock:
+                for (post_id, _), (wanted, stored) in flushing.items():
+                    self._add_pending(post_id, wanted, stored, -1)
+                self._flushing = {}
+                self.flushed += len(flushing) - len(dropped)
+                self.dropped += len(dropped)
+                self.flushes += 1
+            return len(flushing) - len(dropped)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def _start_worker(self):
+        if self._worker is not None:
+            return
+        with self._flush_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='reaction-buffer', daemon=True)
+                self._worker.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Flushing %s buffered reactions failed", len(self))
+            finally:
+                close_old_connections()
+
+
+buffer = ReactionBuffer()
+
+
+def write_behind_enabled():
+    return REACTION_WRITE_BEHIND
+
+
+def current_reactions(user, post_ids):
+    """
+    ({post_id: reaction_type}, {post_id: stored}) for the user: the
+    buffered state where there is one, the table's otherwise. `stored`
+    holds the table rows read, for record().
+    """
+    current = buffer.lookup(user.id, post_ids)
+    missing = [post_id for post_id in post_ids if post_id not in current]
+    stored = dict(
+        Reaction.objects.filter(user=user, post_id__in=missing).values_list('post_id', 'reaction_type')
+    ) if missing else {}
+    for post_id in missing:
+        current[post_id] = stored.get(post_id)
+    return current, stored
+
+
+def toggle_reaction(post, user, reaction_type):
+    """
+    Buffered PostReactionView toggle: set `reaction_type`, or remove it if
+    it's the user's current reaction. Returns the new reaction type.
+    """
+    current, stored = current_reactions(user, [post.id])
+    wanted = None if current[post.id] == reaction_type else reaction_type
+    buffer.record(post.id, user, wanted, stored.get(post.id))
+    return wanted
+
+
+def buffer_reaction_batch(user, items):
+    """
+    Buffered apply_reaction_batch, with the same results. Statuses are
+    relative to the user's buffered state.
+    """
+    results, latest = parse_batch(items)
+    existing = set(Post.objects.filter(pk__in=latest).values_list('id', flat=True)) if latest else set()
+    current, stored = current_reactions(user, list(existing))
+    statuses = {}
+    for post_id, (_, action, reaction_type) in latest.items():
+        if post_id not in existing:
+            statuses[post_id] = "not_found"
+            continue
+        wanted = reaction_type if action == SET else None
+        statuses[post_id] = change_status(current[post_id], wanted)
+        if statuses[post_id] != "unchanged":
+            buffer.record(post_id, user, wanted, stored.get(post_id))
+    return batch_results(results, latest, statuses)
+
+
+def reaction_state(post, user):
+    """
+    The post's counters and the user's reaction, including buffered writes.
+    """
+    current, _ = current_reactions(user, [post.id])
+    state = {"like_count": post.like_count, "dislike_count": post.dislike_count}
+    for field, delta in buffer.pending([post.id]).get(post.id, {}).items():
+        state[field] += delta
+    state["reaction_type"] = current[post.id]
+    return state
+
+
+def merge_counts(rendered, pending=None):
+    """
+    Copies of rendered posts (dicts with id and counters) with the
+    pending counter deltas added. `pending` is buffer.pending() for them,
+    if the caller already has it.
+    """
+    if pending is None:
+        pending = buffer.pending([item['id'] for item in rendered])
+    if not pending:
+        return rendered
+    merged = []
+    for item in rendered:
+        deltas = pending.get(item['id'])
+        if deltas:
+            item = {**item, **{field: item[field] + delta for field, delta in deltas.items()}}
+        merged.append(item)
+    return merged
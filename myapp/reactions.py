@@ -0,0 +1,179 @@
+"""
+Batched reaction writes.
+
+apply_reaction_batch() takes a list of {post_id, reaction_type, action}
+items from one user (e.g. an offline client replaying its queue) and
+applies them with a fixed number of queries whatever the batch size:
+one each to validate the posts and users, one to read current reactions,
+then a bulk upsert and a bulk delete in one transaction, counters
+updated per distinct delta and one outbox insert for notifications.
+
+The write itself is apply_changes(), which takes the wanted state of
+any number of (post, user) pairs, so the write-behind buffer
+(reaction_buffer.py) flushes through the same path.
+"""
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Post, Reaction, User
+from .post_cache import posts_changed
+from .signals import enqueue_notifications
+
+REACTION_BATCH_MAX_ITEMS = getattr(settings, 'REACTION_BATCH_MAX_ITEMS', 100)
+
+SET = 'set'
+REMOVE = 'remove'
+ACTIONS = (SET, REMOVE)
+
+
+class ReactionBatchError(ValueError):
+    pass
+
+
+def _validate(index, item):
+    """
+    (post_id, action, reaction_type) of an item, or an error result.
+    """
+    if not isinstance(item, dict):
+        return None, {"index": index, "status": "invalid", "error": "Item must be an object"}
+    post_id, action = item.get('post_id'), item.get('action', SET)
+    reaction_type = item.get('reaction_type')
+    if not isinstance(post_id, int) or isinstance(post_id, bool):
+        error = "post_id must be an integer"
+    elif action not in ACTIONS:
+        error = f"action must be one of {', '.join(ACTIONS)}"
+    elif action == SET and reaction_type not in Reaction.COUNTER_FIELDS:
+        error = "Invalid reaction type"
+    else:
+        return (post_id, action, reaction_type), None
+    return None, {"index": index, "post_id": post_id, "status": "invalid", "error": error}
+
+
+def parse_batch(items):
+    """
+    Validate a batch. Returns (results, latest): `results` has one slot
+    per item, filled in for invalid and superseded items, and `latest`
+    maps each post_id to the (index, action, reaction_type) of the last
+    valid item for it.
+    """
+    if not isinstance(items, list):
+        raise ReactionBatchError("Expected a list of reactions")
+    if len(items) > REACTION_BATCH_MAX_ITEMS:
+        raise ReactionBatchError(f"At most {REACTION_BATCH_MAX_ITEMS} reactions per batch")
+
+    results = [None] * len(items)
+    latest = {}
+    for index, item in enumerate(items):
+        parsed, error = _validate(index, item)
+        if error:
+            results[index] = error
+            continue
+        post_id, action, reaction_type = parsed
+        if post_id in latest:
+            results[latest[post_id][0]] = {"index": latest[post_id][0], "post_id": post_id, "status": "superseded"}
+        latest[post_id] = (index, action, reaction_type)
+    return results, latest
+
+
+def change_status(previous, wanted):
+    """
+    Result status for moving a reaction from `previous` to `wanted`
+    (a reaction type, or None for no reaction).
+    """
+    if previous == wanted:
+        return "unchanged"
+    if wanted is None:
+        return "removed"
+    return "created" if previous is None else "updated"
+
+
+def batch_results(results, latest, statuses):
+    """
+    Fill in `results` for the items in `latest` from {post_id: status}.
+    """
+    for post_id, (index, action, reaction_type) in latest.items():
+        result = {"index": index, "post_id": post_id, "action": action}
+        if statuses[post_id] != "not_found":
+            result["reaction_type"] = reaction_type if action == SET else None
+        result["status"] = statuses[post_id]
+        results[index] = result
+    return results
+
+
+def _add_delta(deltas, post_id, reaction_type, step):
+    field = Reaction.COUNTER_FIELDS[reaction_type]
+    post_deltas = deltas.setdefault(post_id, {})
+    post_deltas[field] = post_deltas.get(field, 0) + step
+
+
+def apply_changes(changes, users):
+    """
+    Write {(post_id, user_id): reaction_type or None} in one transaction.
+    `users` maps user ids to User objects, the senders of notifications
+    for new reactions. Returns {(post_id, user_id): status}; pairs whose
+    post or user no longer exists are skipped as not_found.
+    """
+    statuses = {}
+    with transaction.atomic():
+        user_ids = set(User.objects.filter(pk__in={user_id for _, user_id in changes}).values_list('id', flat=True))
+        authors = dict(Post.objects.filter(pk__in={post_id for post_id, _ in changes}).values_list('id', 'user_id'))
+        current = {
+            (post_id, user_id): reaction_type
+            for post_id, user_id, reaction_type in Reaction.objects.filter(
+                post_id__in=authors, user_id__in=user_ids,
+            ).values_list('post_id', 'user_id', 'reaction_type')
+        }
+
+        upserts, removals, deltas, notifications = [], {}, {}, []
+        for (post_id, user_id), wanted in changes.items():
+            if post_id not in authors or user_id not in user_ids:
+                statuses[post_id, user_id] = "not_found"
+                continue
+            previous = current.get((post_id, user_id))
+            statuses[post_id, user_id] = status = change_status(previous, wanted)
+            if status == "unchanged":
+                continue
+            if previous is not None:
+                _add_delta(deltas, post_id, previous, -1)
+            if wanted is None:
+                removals.setdefault(user_id, []).append(post_id)
+                continue
+            _add_delta(deltas, post_id, wanted, 1)
+            reaction = Reaction(post_id=post_id, user_id=user_id, reaction_type=wanted)
+            upserts.append(reaction)
+            if previous is None and authors[post_id] != user_id:
+                notifications.append((authors[post_id], wanted, reaction, users[user_id], post_id))
+
+        if upserts:
+            Reaction.objects.bulk_create(
+                upserts, update_conflicts=True, unique_fields=['post', 'user'], update_fields=['reaction_type'],
+            )
+        if removals:
+            Reaction.objects.filter(
+                reduce(or_, (Q(user_id=user_id, post_id__in=post_ids) for user_id, post_ids in removals.items()))
+            ).delete()
+        Post.apply_counter_deltas(deltas)
+        enqueue_notifications(notifications)
+        # bulk_create skips post_save, so bump the post cache versions here
+        posts_changed({reaction.post_id for reaction in upserts})
+    return statuses
+
+
+def apply_reaction_batch(user, items):
+    """
+    Apply `items` in order for `user`. A later item for the same post
+    supersedes an earlier one. Returns one result dict per item, with a
+    status of created, updated, removed, unchanged, superseded,
+    not_found or invalid.
+    """
+    results, latest = parse_batch(items)
+    statuses = apply_changes(
+        {(post_id, user.id): (reaction_type if action == SET else None)
+         for post_id, (_, action, reaction_type) in latest.items()},
+        {user.id: user},
+    ) if latest else {}
+    return batch_results(results, latest, {post_id: status for (post_id, _), status in statuses.items()})
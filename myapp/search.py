@@ -0,0 +1,152 @@
+"""
+Full-text search over posts and comments (SQLite FTS5).
+
+`myapp_search` holds one row per post (title + content) and per comment
+(content). Row ids are derived from the object id, posts even and
+comments odd, so signals can replace or delete an entry by rowid as
+objects are saved and deleted, inside the same transaction.
+`python manage.py rebuild_search_index` refills it in bulk.
+
+Queries match every term as a prefix, rank by BM25 (title weighted above
+body) and page with a (score, rowid) keyset cursor. Results whose author
+or post author is inactive are filtered out in the same query.
+
+Only available on SQLite; elsewhere search_enabled() is False and the
+sync hooks do nothing.
+"""
+import re
+
+from django.db import connection
+
+from .models import Comment, Post, User
+
+SEARCH_TABLE = 'myapp_search'
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+MAX_QUERY_TERMS = 8
+TERM = re.compile(r'\w+', re.UNICODE)
+
+
+class SearchError(ValueError):
+    pass
+
+
+def search_enabled():
+    return connection.vendor == 'sqlite'
+
+
+def post_rowid(post_id):
+    return post_id * 2
+
+
+def comment_rowid(comment_id):
+    return comment_id * 2 + 1
+
+
+def create_table_sql():
+    return (
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+        "kind UNINDEXED, object_id UNINDEXED, post_id UNINDEXED, author_id UNINDEXED, title, body, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+
+
+def _replace(rowid, kind, object_id, post_id, author_id, title, body):
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [rowid])
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, kind, object_id, post_id, author_id, title, body) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            [rowid, kind, object_id, post_id, author_id, title, body],
+        )
+
+
+def _delete(rowid):
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [rowid])
+
+
+def index_post(post):
+    if search_enabled():
+        _replace(post_rowid(post.pk), 'post', post.pk, post.pk, post.user_id, post.title, post.content)
+
+
+def unindex_post(post_id):
+    if search_enabled():
+        _delete(post_rowid(post_id))
+
+
+def index_comment(comment):
+    if search_enabled():
+        _replace(comment_rowid(comment.pk), 'comment', comment.pk, comment.post_id, comment.user_id, '', comment.content)
+
+
+def unindex_comment(comment_id):
+    if search_enabled():
+        _delete(comment_rowid(comment_id))
+
+
+def rebuild_index():
+    """
+    Refill the index from the post and comment tables.
+    Returns (posts, comments) indexed.
+    """
+    post_table, comment_table = Post._meta.db_table, Comment._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(create_table_sql())
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, kind, object_id, post_id, author_id, title, body) "
+            f"SELECT id * 2, 'post', id, id, user_id, title, content FROM {post_table}"
+        )
+        posts = cursor.rowcount
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, kind, object_id, post_id, author_id, title, body) "
+            f"SELECT id * 2 + 1, 'comment', id, post_id, user_id, '', content FROM {comment_table}"
+        )
+        comments = cursor.rowcount
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+    return posts, comments
+
+
+def match_expression(query):
+    """
+    FTS5 MATCH expression requiring every term of `query` as a prefix.
+    Terms are quoted, so FTS5 operators typed by users are plain text.
+    """
+    terms = TERM.findall(query)[:MAX_QUERY_TERMS]
+    if not terms:
+        raise SearchError("Query has no searchable terms")
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search(query, after=None, limit=20):
+    """
+    Best matches for `query`, as dicts with kind, object_id, post_id,
+    snippet, score and rowid. `after` is the (score, rowid) of the last
+    result of the previous page.
+    """
+    user_table, post_table = User._meta.db_table, Post._meta.db_table
+    params = [match_expression(query)]
+    keyset = ''
+    if after:
+        keyset = "AND (s.score > %s OR (s.score = %s AND s.rowid > %s))"
+        params += [after[0], after[0], after[1]]
+    sql = (
+        "SELECT s.rowid, s.kind, s.object_id, s.post_id, s.snippet, s.score FROM ("
+        f"  SELECT rowid, kind, object_id, post_id, author_id,"
+        f"         snippet({SEARCH_TABLE}, -1, '[', ']', '…', 12) AS snippet,"
+        f"         bm25({SEARCH_TABLE}, 0, 0, 0, 0, {TITLE_WEIGHT}, {BODY_WEIGHT}) AS score"
+        f"  FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s"
+        ") s "
+        f"JOIN {post_table} p ON p.id = s.post_id "
+        f"JOIN {user_table} pu ON pu.id = p.user_id AND pu.is_active "
+        f"JOIN {user_table} au ON au.id = s.author_id AND au.is_active "
+        f"WHERE 1 {keyset} "
+        "ORDER BY s.score, s.rowid LIMIT %s"
+    )
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        columns = ['rowid', 'kind', 'object_id', 'post_id', 'snippet', 'score']
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
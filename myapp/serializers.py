@@ -1,5 +1,9 @@
 from rest_framework import serializers
 from .models import *
+from django.conf import settings
+from .derivatives import variant_urls
+
+FEED_COMMENT_PREVIEW_SIZE = getattr(settings, 'FEED_COMMENT_PREVIEW_SIZE', 3)
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -13,18 +17,36 @@ class CreatorSerializer(serializers.ModelSerializer):
         fields = ['is_creator']
 
 class UserPostSerializer(serializers.ModelSerializer):
+    variants = serializers.SerializerMethodField()
+
     class Meta:
         model = Post
-        fields = ['id','title','content','file','post_type','created_at']
+        fields = ['id','title','content','file','variants','post_type','created_at']
+
+    def get_variants(self, obj):
+        return variant_urls(obj)
 
 class PostSerializer(serializers.ModelSerializer):
     post_type = serializers.CharField(required=True)
+    # A finalized chunked upload (see uploads.py) to use instead of `file`
+    upload_id = serializers.UUIDField(write_only=True, required=False)
 
     class Meta:
         model = Post
-        fields = ['content', 'file', 'post_type','title']
+        fields = ['content', 'file', 'post_type','title', 'upload_id']
 
     def validate(self, attrs):
+        upload_id = attrs.pop('upload_id', None)
+        if upload_id:
+            request = self.context.get('request')
+            upload = Upload.objects.select_related('blob').filter(
+                pk=upload_id, user_id=getattr(request.user, 'id', None), blob__isnull=False,
+            ).first()
+            if upload is None:
+                raise serializers.ValidationError({'upload_id': 'No finalized upload with this id.'})
+            attrs['file'] = upload.blob.file.name
+            attrs['blob'] = upload.blob
+
         post_type = attrs.get('post_type')
         file = attrs.get('file')
         content = attrs.get('content')
@@ -52,17 +74,29 @@ class ReactionSerializer(serializers.ModelSerializer):
 class NotificationSerializer(serializers.ModelSerializer):
     sender_email = serializers.CharField(source='sender.email', read_only=True)
     sender_name = serializers.CharField(source='sender.name', read_only=True)
+    is_read = serializers.SerializerMethodField()
 
     class Meta:
         model = Notification
         fields = [
             'id', 'sender', 'sender_email', 'sender_name', 'receiver',
-            'notification_type', 'post', 'comment', 'is_read', 'created_at'
+            'notification_type', 'post', 'comment', 'actor_count', 'recent_actors',
+            'is_read', 'created_at'
         ]
         read_only_fields = fields
 
+    def get_is_read(self, obj):
+        # Read if under the user's watermark (passed in context) or marked read individually
+        watermark = self.context.get('read_watermark', 0)
+        return obj.is_read or obj.id <= watermark
+
+class CommentAuthorSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ['id', 'name']
+
 class CommentSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
+    user = CommentAuthorSerializer(read_only=True)
     created_at = serializers.DateTimeField(read_only=True)
 
     class Meta:
@@ -70,25 +104,23 @@ class CommentSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'content', 'created_at']
 
 class feedSerializer(serializers.ModelSerializer):
-    like_count = serializers.SerializerMethodField()
-    dislike_count = serializers.SerializerMethodField()
-    comments = CommentSerializer(many=True, read_only=True)
-    comment_count = serializers.SerializerMethodField()
+    comments = serializers.SerializerMethodField()
+    variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
         fields = [
-            'id', 'title', 'content', 'file', 'post_type', 'user_id', 
+            'id', 'title', 'content', 'file', 'variants', 'post_type', 'user_id', 
             'created_at', 'updated_at',
             'like_count', 'dislike_count', 'comments', 'comment_count'
         ]
 
-    def get_like_count(self, obj):
-        return obj.reactions.filter(reaction_type=Reaction.LIKE).count()
-
-    def get_dislike_count(self, obj):
-        return obj.reactions.filter(reaction_type=Reaction.DISLIKE).count()
-
-    def get_comment_count(self, obj):
-        return obj.comments.count()       
+    def get_comments(self, obj):
+        # Previews are attached in bulk by Comment.attach_previews; fall back to a per-post query
+        preview = getattr(obj, 'comment_preview', None)
+        if preview is None:
+            preview = obj.comments.select_related('user').order_by('-created_at', '-id')[:FEED_COMMENT_PREVIEW_SIZE]
+        return CommentSerializer(preview, many=True).data
 
+    def get_variants(self, obj):
+        return variant_urls(obj)
@@ -1,79 +1,146 @@
-from django.db.models.signals import post_save
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import Reaction, Comment, Subscription, Notification
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
+from .models import User, Post, Reaction, Comment, Subscription, NotificationOutbox
+from .outbox import build_payload, schedule_inline_dispatch
+from .user_cache import invalidate_user
+from .derivatives import needs_derivatives, schedule_derivatives
+from .search import index_comment, index_post, unindex_comment, unindex_post
+from .post_cache import creator_post_changed, post_changed, subscriptions_changed
+from .follows import follows_changed
 
-def _send_ws_notification(receiver, notif_type, instance, sender_user):
+OUTBOX_INLINE_DISPATCH = getattr(settings, 'OUTBOX_INLINE_DISPATCH', False)
+
+
+def _enqueue_notification(receiver, notif_type, instance, sender_user, post=None, comment=None):
     """
-    Send real-time notification over Channels to the receiver.
+    Queue a notification in the outbox. The row commits or rolls back
+    together with the write that caused it; storing the Notification and
+    the websocket push happen later in the dispatcher.
     """
-    channel_layer = get_channel_layer()
-    group_name = f"user_{receiver.id}"
-
-    # Build dynamic message based on notification type
-    if notif_type == "like":
-        message = f"{sender_user.name} liked your post (ID: {instance.post.id})"
-    elif notif_type == "dislike":
-        message = f"{sender_user.name} disliked your post (ID: {instance.post.id})"
-    elif notif_type == "comment":
-        message = f"{sender_user.name} commented on your post (ID: {instance.post.id}): \"{instance.content}\""
-    elif notif_type == "follow":
-        message = f"{sender_user.name} subscribed to you"
-    else:
-        message = f"New {notif_type} from {sender_user.name}"
-
-    data = {
-        "type": "send_notification",
-        "notification": {
-            "type": notif_type,
-            "sender": {
-                "id": sender_user.id,
-                "username": sender_user.name,
-            },
-            "message": message,
-            "post_id": getattr(instance, "post_id", None),
-            "comment_id": getattr(instance, "id", None) if notif_type == "comment" else None
-        }
-    }
-
-    async_to_sync(channel_layer.group_send)(group_name, data)
+    NotificationOutbox.objects.create(
+        sender=sender_user,
+        receiver=receiver,
+        notification_type=notif_type,
+        post=post,
+        comment=comment,
+        payload=build_payload(notif_type, instance, sender_user),
+    )
+    if OUTBOX_INLINE_DISPATCH:
+        schedule_inline_dispatch()
+
+
+def enqueue_notifications(events):
+    """
+    Bulk version of _enqueue_notification for (receiver_id, notif_type,
+    instance, sender_user, post_id) tuples, one INSERT for all of them.
+    """
+    NotificationOutbox.objects.bulk_create([
+        NotificationOutbox(
+            sender=sender_user,
+            receiver_id=receiver_id,
+            notification_type=notif_type,
+            post_id=post_id,
+            payload=build_payload(notif_type, instance, sender_user),
+        )
+        for receiver_id, notif_type, instance, sender_user, post_id in events
+    ])
+    if events and OUTBOX_INLINE_DISPATCH:
+        schedule_inline_dispatch()
 
 
 # Reaction Notification
 @receiver(post_save, sender=Reaction)
 def reaction_notification(sender, instance, created, **kwargs):
-    if created and instance.post.user != instance.user:
-        Notification.objects.create(
-            sender=instance.user,
-            receiver=instance.post.user,
-            notification_type=instance.reaction_type,  # 'like' or 'dislike'
+    if created and instance.post.user_id != instance.user_id:
+        _enqueue_notification(
+            instance.post.user, instance.reaction_type, instance, instance.user,  # 'like' or 'dislike'
             post=instance.post
         )
-        _send_ws_notification(instance.post.user, instance.reaction_type, instance, instance.user)
 
 
 # Comment Notification
 @receiver(post_save, sender=Comment)
 def comment_notification(sender, instance, created, **kwargs):
-    if created and instance.post.user != instance.user:
-        Notification.objects.create(
-            sender=instance.user,
-            receiver=instance.post.user,
-            notification_type='comment',
+    if created and instance.post.user_id != instance.user_id:
+        _enqueue_notification(
+            instance.post.user, "comment", instance, instance.user,
             post=instance.post,
             comment=instance
         )
-        _send_ws_notification(instance.post.user, "comment", instance, instance.user)
 
 
 # Subscription Notification
 @receiver(post_save, sender=Subscription)
 def subscription_notification(sender, instance, created, **kwargs):
-    if created and instance.subscribed_to != instance.subscriber:
-        Notification.objects.create(
-            sender=instance.subscriber,
-            receiver=instance.subscribed_to,
-            notification_type='follow'
-        )
-        _send_ws_notification(instance.subscribed_to, "follow", instance, instance.subscriber)
+    if created and instance.subscribed_to_id != instance.subscriber_id:
+        _enqueue_notification(instance.subscribed_to, "follow", instance, instance.subscriber)
+
+
+# Drop cached users when their row changes
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+# Bump post cache versions (see post_cache.py)
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_cached_post(sender, instance, **kwargs):
+    creator_post_changed(instance.pk, instance.user_id)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Reaction)
+@receiver(post_delete, sender=Reaction)
+def invalidate_cached_post_activity(sender, instance, **kwargs):
+    post_changed(instance.post_id)
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def invalidate_cached_subscriptions(sender, instance, **kwargs):
+    subscriptions_changed(instance.subscriber_id)
+
+
+# Keep the cached follower/following lists current (see follows.py)
+@receiver(post_save, sender=Subscription)
+def follow_added(sender, instance, created, **kwargs):
+    if created:
+        follows_changed(instance.subscriber_id, added=[(instance.pk, instance.subscribed_to_id)])
+
+
+@receiver(post_delete, sender=Subscription)
+def follow_removed(sender, instance, **kwargs):
+    follows_changed(instance.subscriber_id, removed=[instance.subscribed_to_id])
+
+
+# Resize newly saved images in the background
+@receiver(post_save, sender=Post)
+def generate_post_derivatives(sender, instance, **kwargs):
+    if needs_derivatives(instance):
+        transaction.on_commit(lambda: schedule_derivatives(instance))
+
+
+# Keep the full-text search index in sync (see search.py)
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, **kwargs):
+    index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_deleted_post(sender, instance, **kwargs):
+    unindex_post(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def index_saved_comment(sender, instance, **kwargs):
+    index_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_deleted_comment(sender, instance, **kwargs):
+    unindex_comment(instance.pk)
@@ -1,3 +1,588 @@
-from django.test import TestCase
+import hashlib
+import os
+import shutil
+import tempfile
+from io import StringIO
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import fanout, follows, outbox, timeline, uploads
+from .models import Comment, Notification, NotificationOutbox, Post, Reaction, Subscription, TimelineEntry, Upload, User
+from .reaction_buffer import ReactionBuffer
+from .uploads import UploadConflict
+
+
+def make_user(name, creator=False):
+    user = User.objects.create_user(f"{name}@example.com", name, True, "password")
+    if creator:
+        user.is_creator = True
+        user.save()
+    return user
+
+
+def client_for(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+class FakeChannelLayer:
+    def __init__(self):
+        self.sent = []
+
+    async def group_send(self, group, message):
+        self.sent.append((group, message['notification']))
+
+
+class BlogTestCase(TestCase):
+    def setUp(self):
+        # versions, renders, unread counters and the hot index live in the cache
+        cache.clear()
+        self.layer = FakeChannelLayer()
+        for module in (outbox, fanout):
+            patcher = mock.patch.object(module, 'get_channel_layer', return_value=self.layer)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def drain(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return outbox.drain()
+
+
+class FeedPaginationTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.followed = make_user('followed', creator=True)
+        self.other = make_user('other', creator=True)
+        self.viewer = make_user('viewer')
+        now = timezone.now()
+        self.subscribed_ids = []
+        for i in range(3):
+            post = Post.objects.create(user=self.followed, title=f'followed {i}', content='c')
+            Post.objects.filter(pk=post.pk).update(created_at=now - timedelta(minutes=10 - i))
+            self.subscribed_ids.insert(0, post.id)
+        self.recent_ids = [
+            Post.objects.create(user=self.other, title=f'other {i}', content='c').id for i in range(4)
+        ]
+        self.client = client_for(self.viewer)
+        self.assertEqual(self.client.post(f'/subscribe/{self.followed.id}/').status_code, 201)
+
+    def pages(self, limit):
+        pages, cursor = [], None
+        while True:
+            response = self.client.get('/feed/', {'limit': limit, **({'cursor': cursor} if cursor else {})})
+            self.assertEqual(response.status_code, 200)
+            pages.append([item['id'] for item in response.data['results']])
+            cursor = response.data['next_cursor']
+            if cursor is None:
+                return pages
+            self.assertLess(len(pages), 10)
+
+    def test_pages_cross_from_subscribed_to_recent(self):
+        pages = self.pages(limit=2)
+        seen = [post_id for page in pages for post_id in page]
+        self.assertEqual(seen[:3], self.subscribed_ids)
+        self.assertCountEqual(seen[3:], self.recent_ids)
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertTrue(all(len(page) == 2 for page in pages[:-1]))
+        # the second page holds the last subscribed post and the first recent one
+        self.assertEqual(pages[1][0], self.subscribed_ids[2])
+        self.assertIn(pages[1][1], self.recent_ids)
+
+    def test_page_boundary_on_the_last_subscribed_post(self):
+        pages = self.pages(limit=3)
+        self.assertEqual(pages[0], self.subscribed_ids)
+        self.assertCountEqual([post_id for page in pages[1:] for post_id in page], self.recent_ids)
+
+    def test_bad_cursor_is_rejected(self):
+        self.assertEqual(self.client.get('/feed/', {'cursor': 'not-a-cursor'}).status_code, 400)
+
+    def test_unchanged_page_is_not_modified(self):
+        response = self.client.get('/feed/')
+        self.assertIn('Last-Modified', response)
+        etag, modified = response['ETag'], response['Last-Modified']
+        self.assertEqual(self.client.get('/feed/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get('/feed/', HTTP_IF_MODIFIED_SINCE=modified).status_code, 304)
+        # If-Modified-Since is ignored when If-None-Match is sent
+        response = self.client.get('/feed/', HTTP_IF_NONE_MATCH='"stale"', HTTP_IF_MODIFIED_SINCE=modified)
+        self.assertEqual(response.status_code, 200)
+
+    def test_edited_post_moves_last_modified(self):
+        modified = self.client.get('/feed/')['Last-Modified']
+        Post.objects.filter(pk=self.subscribed_ids[0]).update(updated_at=timezone.now() + timedelta(minutes=1))
+        response = self.client.get('/feed/', HTTP_IF_MODIFIED_SINCE=modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['Last-Modified'], modified)
+
+
+class OutboxCoalescingTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.creator = make_user('creator', creator=True)
+        self.post = Post.objects.create(user=self.creator, title='t', content='c')
+        self.fans = [make_user(f'fan{i}') for i in range(7)]
+
+    def like(self, user):
+        response = client_for(user).post(f'/post-reaction/{self.post.id}/', {'reaction_type': 'like'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_likes_are_coalesced_into_one_aggregate(self):
+        for fan in self.fans:
+            self.like(fan)
+        self.assertEqual(self.drain(), (7, 0))
+
+        aggregate = Notification.objects.get(receiver=self.creator)
+        self.assertEqual(aggregate.notification_type, 'like')
+        self.assertEqual(aggregate.actor_count, 7)
+        self.assertEqual(len(aggregate.recent_actors), outbox.NOTIFICATION_ACTOR_SAMPLE_SIZE)
+        self.assertEqual(aggregate.recent_actors[0]['id'], self.fans[-1].id)
+        self.assertEqual(len(self.layer.sent), 1)
+        group, frame = self.layer.sent[0]
+        self.assertEqual(group, f"user_{self.creator.id}")
+        self.assertEqual(frame['id'], aggregate.id)
+        self.assertEqual(frame['actor_count'], 7)
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    def test_returning_actors_are_counted_once(self):
+        for fan in self.fans:
+            self.like(fan)
+        self.drain()
+        for fan in self.fans:
+            self.like(fan)  # unlike
+            self.like(fan)  # and like again
+        self.drain()
+
+        aggregate = Notification.objects.get(receiver=self.creator)
+        self.assertEqual(aggregate.actor_count, 7)
+        self.assertEqual(sorted(aggregate.actor_ids), sorted(fan.id for fan in self.fans))
+
+    def test_own_reactions_are_not_notified(self):
+        self.like(self.creator)
+        self.assertEqual(self.drain(), (0, 0))
+        self.assertFalse(Notification.objects.exists())
+
+    def test_events_claimed_by_another_dispatcher_are_skipped(self):
+        self.like(self.fans[0])
+        NotificationOutbox.objects.update(claimed_by='other', claimed_at=timezone.now())
+        self.assertEqual(self.drain(), (0, 0))
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(self.layer.sent, [])
+
+    def test_stale_claim_is_taken_over(self):
+        self.like(self.fans[0])
+        stale = timezone.now() - timedelta(seconds=outbox.OUTBOX_CLAIM_TIMEOUT + 1)
+        NotificationOutbox.objects.update(claimed_by='dead', claimed_at=stale)
+        self.assertEqual(self.drain(), (1, 0))
+        self.assertEqual(len(self.layer.sent), 1)
+
+    def test_failed_push_releases_claim(self):
+        self.like(self.fans[0])
+        with mock.patch.object(self.layer, 'group_send', side_effect=ConnectionError('down')), \
+                self.assertLogs('myapp.outbox', 'WARNING'):
+            self.assertEqual(self.drain(), (0, 1))
+        event = NotificationOutbox.objects.get()
+        self.assertEqual((event.claimed_by, event.claimed_at, event.attempts), ('', None, 1))
+
+
+class UnreadCountTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.creator = make_user('creator', creator=True)
+        self.client = client_for(self.creator)
+        self.followers = [make_user(f'follower{i}') for i in range(3)]
+
+    def follow(self, user):
+        self.assertEqual(client_for(user).post(f'/subscribe/{self.creator.id}/').status_code, 201)
+        self.drain()
+
+    def unread_count(self):
+        return self.client.get('/notifications/unread-count/').data['unread_count']
+
+    def test_counts_follow_notifications(self):
+        self.assertEqual(self.unread_count(), 0)
+        for follower in self.followers:
+            self.follow(follower)
+        self.assertEqual(self.unread_count(), 3)
+        self.assertEqual(len(self.client.get('/notifications/').data), 3)
+
+    def test_replayed_event_is_not_counted_twice(self):
+        self.assertEqual(self.unread_count(), 0)
+        self.follow(self.followers[0])
+        NotificationOutbox.objects.create(
+            sender=self.followers[0], receiver=self.creator, notification_type='follow', payload={'type': 'follow'},
+        )
+        self.drain()
+        self.assertEqual(Notification.objects.filter(receiver=self.creator).count(), 1)
+        self.assertEqual(self.unread_count(), 1)
+
+    def test_mark_read_and_mark_all(self):
+        for follower in self.followers:
+            self.follow(follower)
+        self.assertEqual(self.unread_count(), 3)
+
+        first = Notification.objects.filter(receiver=self.creator).order_by('id').first()
+        self.client.post(f'/notifications/{first.id}/read/')
+        self.assertEqual(self.unread_count(), 2)
+
+        self.client.post('/notifications/mark-all/')
+        self.assertEqual(self.unread_count(), 0)
+        self.assertEqual(self.client.get('/notifications/').data, [])
+        self.assertEqual(Notification.objects.filter(receiver=self.creator, is_read=False).count(), 2)
+
+        # anything after the watermark is unread again, counted or recounted
+        self.follow(make_user('latecomer'))
+        self.assertEqual(self.unread_count(), 1)
+        cache.clear()
+        self.assertEqual(self.unread_count(), 1)
+        self.assertEqual(len(self.client.get('/notifications/').data), 1)
+
+
+class CommentCounterTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.creator = make_user('creator', creator=True)
+        self.post = Post.objects.create(user=self.creator, title='t', content='c')
+        self.client = client_for(self.creator)
+
+    def comment_count(self):
+        return Post.objects.get(pk=self.post.pk).comment_count
+
+    def test_comment_counter_follows_adds_and_deletes(self):
+        self.assertEqual(self.client.post(f'/post-comment/{self.post.id}/', {'content': 'hi'}).status_code, 201)
+        self.assertEqual(self.comment_count(), 1)
+        comment = self.post.comments.get()
+        self.assertEqual(self.client.delete(f'/post-comment/{comment.id}/').status_code, 204)
+        self.assertEqual(self.comment_count(), 0)
+
+    def test_concurrent_delete_decrements_once(self):
+        for content in ('first', 'second'):
+            self.client.post(f'/post-comment/{self.post.id}/', {'content': content})
+        comment = self.post.comments.get(content='first')
+        # the other request already deleted the row this one has loaded
+        Comment.objects.filter(pk=comment.pk).delete()
+        Post.bump_counters(self.post.id, comment_count=-1)
+        with mock.patch('myapp.views.get_object_or_404', return_value=comment):
+            self.assertEqual(self.client.delete(f'/post-comment/{comment.id}/').status_code, 204)
+        self.assertEqual(self.comment_count(), 1)
+
+    def test_counters_are_clamped_at_zero(self):
+        Post.bump_counters(self.post.id, like_count=-1, comment_count=-2)
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual((post.like_count, post.comment_count), (0, 0))
+
+
+class ReactionBufferTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.creator = make_user('creator', creator=True)
+        self.post = Post.objects.create(user=self.creator, title='t', content='c')
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.buffer = ReactionBuffer(flush_interval=3600)
+        patcher = mock.patch.object(ReactionBuffer, '_start_worker')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def like_count(self):
+        self.post.refresh_from_db()
+        return self.post.like_count
+
+    def test_flush_writes_rows_and_counters(self):
+        self.buffer.record(self.post.id, self.alice, 'like', None)
+        self.buffer.record(self.post.id, self.bob, 'dislike', None)
+        self.buffer.record(self.post.id, self.bob, 'like', None)  # last write wins
+        self.assertEqual(self.buffer.pending([self.post.id]), {self.post.id: {'like_count': 2}})
+        self.assertEqual(self.buffer.lookup(self.bob.id, [self.post.id]), {self.post.id: 'like'})
+
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.like_count(), 2)
+        self.assertEqual(Reaction.objects.filter(post=self.post, reaction_type='like').count(), 2)
+        self.assertEqual(self.buffer.pending([self.post.id]), {})
+        self.assertEqual(len(self.buffer), 0)
+
+        self.buffer.record(self.post.id, self.alice, None, 'like')
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(self.like_count(), 1)
+        self.assertFalse(Reaction.objects.filter(post=self.post, user=self.alice).exists())
+
+    def test_failed_flush_requeues_entries(self):
+        self.buffer.record(self.post.id, self.alice, 'like', None)
+        with mock.patch('myapp.reaction_buffer.apply_changes', side_effect=OperationalError("database is locked")):
+            with self.assertRaises(OperationalError):
+                self.buffer.flush()
+        self.assertEqual(len(self.buffer), 1)
+        self.assertEqual(self.buffer.pending([self.post.id]), {self.post.id: {'like_count': 1}})
+        self.assertEqual(self.like_count(), 0)
+
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(self.like_count(), 1)
+
+    def test_constraint_violation_drops_only_the_bad_pair(self):
+        from .reactions import apply_changes
+
+        def failing(changes, users):
+            if (self.post.id, self.bob.id) in changes:
+                raise IntegrityError("FOREIGN KEY constraint failed")
+            return apply_changes(changes, users)
+
+        self.buffer.record(self.post.id, self.alice, 'like', None)
+        self.buffer.record(self.post.id, self.bob, 'like', None)
+        with mock.patch('myapp.reaction_buffer.apply_changes', side_effect=failing), \
+                self.assertLogs('myapp.reaction_buffer', 'WARNING') as logs:
+            self.assertEqual(self.buffer.flush(), 1)
+        self.assertIn(f"Dropping buffered reaction like of user {self.bob.id}", logs.output[-1])
+        self.assertEqual(self.buffer.dropped, 1)
+        self.assertEqual(len(self.buffer), 0)
+        self.assertEqual(self.buffer.pending([self.post.id]), {})
+        self.assertEqual(self.like_count(), 1)
+
+    def test_deleted_user_is_skipped(self):
+        self.buffer.record(self.post.id, self.alice, 'like', None)
+        self.buffer.record(self.post.id, self.bob, 'like', None)
+        self.bob.delete()
+        self.buffer.flush()
+        self.assertEqual(self.like_count(), 1)
+        self.assertEqual(list(Reaction.objects.values_list('user_id', flat=True)), [self.alice.id])
+
+
+class ChunkStream:
+    """
+    Request body stand-in that calls `during` once, mid-chunk.
+    """
+
+    def __init__(self, chunks, during=None):
+        self.chunks = list(chunks)
+        self.during = during
+
+    def read(self, size):
+        if self.during:
+            during, self.during = self.during, None
+            during()
+        return self.chunks.pop(0) if self.chunks else b''
+
+
+class ChunkedUploadTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=media)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        patcher = mock.patch.object(uploads, 'CHUNKED_UPLOAD_DIR', os.path.join(media, 'partial'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.creator = make_user('creator', creator=True)
+        self.client = client_for(self.creator)
+
+    def start(self, size=6):
+        response = self.client.post('/uploads/', {'filename': 'clip.mp4', 'size': size}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['upload_id']
+
+    def put(self, upload_id, offset, data):
+        return self.client.put(
+            f'/uploads/{upload_id}/', data, content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def finalize(self, upload_id):
+        return self.client.post(f'/uploads/{upload_id}/finalize/')
+
+    def test_resume_at_server_offset(self):
+        upload_id = self.start()
+        response = self.put(upload_id, 3, b'def')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['offset'], 0)
+
+        self.assertEqual(self.put(upload_id, 0, b'abc').data['offset'], 3)
+        response = self.put(upload_id, 0, b'abc')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['offset'], 3)
+        self.assertEqual(self.client.get(f'/uploads/{upload_id}/').data['offset'], 3)
+        self.assertEqual(self.finalize(upload_id).status_code, 400)
+
+        self.assertEqual(self.put(upload_id, 3, b'def').data['offset'], 6)
+        response = self.finalize(upload_id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['sha256'], hashlib.sha256(b'abcdef').hexdigest())
+        self.assertFalse(response.data['deduplicated'])
+
+    def test_finalized_upload_is_closed(self):
+        upload_id = self.start()
+        self.put(upload_id, 0, b'abcdef')
+        sha256 = self.finalize(upload_id).data['sha256']
+        again = self.finalize(upload_id)
+        self.assertEqual((again.status_code, again.data['sha256']), (200, sha256))
+        self.assertEqual(self.put(upload_id, 6, b'x').status_code, 409)
+
+        duplicate = self.start()
+        self.put(duplicate, 0, b'abcdef')
+        self.assertTrue(self.finalize(duplicate).data['deduplicated'])
+
+    def test_concurrent_finalize_gets_conflict(self):
+        upload_id = self.start()
+        self.put(upload_id, 0, b'abcdef')
+        # another request holds the claim
+        Upload.objects.filter(pk=upload_id).update(status=Upload.FINALIZING)
+        self.assertEqual(self.finalize(upload_id).status_code, 409)
+        self.assertEqual(self.put(upload_id, 6, b'x').status_code, 409)
+        self.assertTrue(os.path.exists(uploads.partial_path(Upload.objects.get(pk=upload_id))))
+
+    def test_failed_finalize_reopens_upload(self):
+        upload_id = self.start()
+        self.put(upload_id, 0, b'abcdef')
+        with mock.patch.object(uploads, '_finalize_claimed', side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                uploads.finalize_upload(Upload.objects.get(pk=upload_id))
+        self.assertEqual(Upload.objects.get(pk=upload_id).status, Upload.OPEN)
+        self.assertEqual(self.finalize(upload_id).status_code, 200)
+
+    def test_overlapping_appends(self):
+        upload_id = self.start(size=None)
+        first, second = Upload.objects.get(pk=upload_id), Upload.objects.get(pk=upload_id)
+
+        def overlap():
+            # a second PUT at the same offset arrives while the first is still streaming
+            with self.assertRaises(UploadConflict):
+                uploads.append_chunk(second, 0, ChunkStream([b'zzzzzz']))
+
+        self.assertEqual(uploads.append_chunk(first, 0, ChunkStream([b'abc'], during=overlap)), 3)
+        with open(uploads.partial_path(first), 'rb') as f:
+            self.assertEqual(f.read(), b'abc')
+        self.assertEqual(Upload.objects.get(pk=upload_id).status, Upload.OPEN)
+        self.assertEqual(self.put(upload_id, 3, b'def').data['offset'], 6)
+
+    def test_finalize_while_appending_gets_conflict(self):
+        upload_id = self.start(size=None)
+        self.put(upload_id, 0, b'abc')
+
+        def overlap():
+            with self.assertRaises(UploadConflict):
+                uploads.finalize_upload(Upload.objects.get(pk=upload_id))
+
+        uploads.append_chunk(Upload.objects.get(pk=upload_id), 3, ChunkStream([b'def'], during=overlap))
+        self.assertEqual(self.finalize(upload_id).data['sha256'], hashlib.sha256(b'abcdef').hexdigest())
+
+    def test_failed_append_releases_claim(self):
+        upload_id = self.start(size=3)
+        response = self.put(upload_id, 0, b'abcdef')
+        self.assertEqual(response.status_code, 413)
+        upload = Upload.objects.get(pk=upload_id)
+        self.assertEqual((upload.status, upload.offset), (Upload.OPEN, 0))
+        self.assertEqual(self.put(upload_id, 0, b'abc').data['offset'], 3)
+
+    def test_purge_abandoned_uploads(self):
+        abandoned, active = self.start(), self.start()
+        self.put(abandoned, 0, b'abc')
+        Upload.objects.filter(pk=abandoned).update(updated_at=timezone.now() - timedelta(days=2))
+        stale = os.path.join(uploads.CHUNKED_UPLOAD_DIR, 'orphan.part')
+        open(stale, 'wb').close()
+        past = (timezone.now() - timedelta(days=2)).timestamp()
+        for path in (stale, os.path.join(uploads.CHUNKED_UPLOAD_DIR, f'{abandoned}.part')):
+            os.utime(path, (past, past))
+
+        self.assertEqual(uploads.purge_abandoned(dry_run=True), (1, 2))
+        self.assertEqual(uploads.purge_abandoned(), (1, 2))
+        self.assertEqual(list(Upload.objects.values_list('pk', flat=True)), [active])
+        self.assertEqual(os.listdir(uploads.CHUNKED_UPLOAD_DIR), [f'{active}.part'])
+
+
+class TimelineFanoutTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.creator = make_user('creator', creator=True)
+        self.fans = [make_user(f'fan{i}') for i in range(3)]
+        for fan in self.fans:
+            self.assertEqual(client_for(fan).post(f'/subscribe/{self.creator.id}/').status_code, 201)
+
+    def publish(self, title):
+        response = client_for(self.creator).post(
+            '/create-post/', {'title': title, 'content': 'c', 'post_type': 'note'}, format='json',
+        )
+        self.assertEqual(response.status_code, 201)
+        return Post.objects.get(title=title)
+
+    def run_worker(self):
+        call_command('fanout_post_notifications', '--once', stdout=StringIO())
+
+    def feed_ids(self, user):
+        return [item['id'] for item in client_for(user).get('/feed/').data['results']]
+
+    def test_worker_pushes_posts_into_timelines(self):
+        post = self.publish('hello')
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.run_worker()
+        self.assertEqual(TimelineEntry.objects.filter(post=post).count(), len(self.fans))
+        self.assertEqual(self.feed_ids(self.fans[0]), [post.id])
+        self.assertEqual(Notification.objects.filter(post=post, notification_type='post').count(), len(self.fans))
+
+    def test_post_deleted_during_fanout_ends_the_job(self):
+        post = self.publish('gone')
+        job = fanout.pending_fanouts().get()
+        Post.objects.filter(pk=post.pk).delete()
+        with self.assertLogs('myapp.fanout', 'INFO'):
+            self.assertEqual(fanout.run_fanout_chunk(job), 0)
+        self.assertIsNotNone(job.completed_at)
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    def test_large_creator_is_pulled_at_read_time(self):
+        with mock.patch.object(timeline, 'TIMELINE_FANOUT_LIMIT', 2):
+            post = self.publish('viral')
+            self.run_worker()
+        self.creator.refresh_from_db()
+        self.assertTrue(self.creator.is_large_creator)
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.assertEqual(self.feed_ids(self.fans[0]), [post.id])
+
+        # back under the limit: the pulled posts are pushed after all
+        self.assertEqual(timeline.refresh_large_creators(), (0, 1))
+        self.assertEqual(TimelineEntry.objects.filter(post=post).count(), len(self.fans))
+        self.assertEqual(self.feed_ids(self.fans[0]), [post.id])
+
+    def test_feed_read_does_not_refresh_large_creators(self):
+        with mock.patch.object(timeline, 'refresh_large_creators') as refresh:
+            self.feed_ids(self.fans[0])
+        refresh.assert_not_called()
+
+
+class FollowWriteTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('user')
+        self.creators = [make_user(f'creator{i}', creator=True) for i in range(2)]
+        self.client = client_for(self.user)
+
+    def stale_following(self, ids):
+        # as if the cached entry missed a change made elsewhere
+        cache.set(follows.adjacency_key(follows.FOLLOWING, self.user.id), {'count': len(ids), 'ids': ids})
+
+    def bulk(self, **data):
+        return self.client.post('/follows/bulk/', data, format='json')
+
+    def test_subscribe_ignores_stale_cache(self):
+        self.stale_following([(999, self.creators[0].id)])
+        self.assertEqual(self.client.post(f'/subscribe/{self.creators[0].id}/').status_code, 201)
+        self.assertEqual(self.client.post(f'/subscribe/{self.creators[0].id}/').status_code, 400)
+
+    def test_bulk_follow_and_unfollow_ignore_stale_cache(self):
+        first, second = self.creators
+        Subscription.objects.create(subscriber=self.user, subscribed_to=second)
+        self.stale_following([(999, first.id)])
+        response = self.bulk(follow=[first.id], unfollow=[second.id])
+        self.assertEqual(response.data['results'], {str(first.id): 'followed', str(second.id): 'unfollowed'})
+        self.assertEqual(
+            list(Subscription.objects.filter(subscriber=self.user).values_list('subscribed_to_id', flat=True)),
+            [first.id],
+        )
+
+    def test_bulk_unfollow_of_a_missing_row_is_unchanged(self):
+        self.stale_following([(999, self.creators[0].id)])
+        response = self.bulk(unfollow=[self.creators[0].id])
+        self.assertEqual(response.data['results'], {str(self.creators[0].id): 'unchanged'})
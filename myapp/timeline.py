@@ -0,0 +1,206 @@
+"""
+Materialized per-user home timelines (fan-out-on-write).
+
+When a creator publishes, the post id is pushed into every subscriber's
+timeline by the fan-out worker (fanout.py), chunk by chunk, so the feed is
+a single indexed read instead of a scan over every followed creator's
+posts. Creators with very large audiences are flagged with
+User.is_large_creator; their posts are skipped at write time and merged
+in when the feed is read (fan-out-on-read). The flag is only maintained
+by the worker (refresh_large_creator per new post, refresh_large_creators
+periodically), never on the read path. When a creator drops back below
+the limit, the posts that were only pulled are copied into their
+subscribers' timelines.
+"""
+from django.conf import settings
+from django.db.models import Count, Q
+
+from .models import Post, Subscription, TimelineEntry, User
+from .pagination import keyset_filter
+
+TIMELINE_MAX_LENGTH = getattr(settings, 'TIMELINE_MAX_LENGTH', 500)
+TIMELINE_TRIM_SLACK = getattr(settings, 'TIMELINE_TRIM_SLACK', 50)
+TIMELINE_FANOUT_LIMIT = getattr(settings, 'TIMELINE_FANOUT_LIMIT', 10000)
+TIMELINE_BATCH_SIZE = getattr(settings, 'TIMELINE_BATCH_SIZE', 1000)
+
+
+def over_fanout_limit(creator_id):
+    """
+    True when the creator has more subscribers than we are willing to
+    fan out to. Counting stops at the limit, so this stays cheap.
+    """
+    subscriber_ids = Subscription.objects.filter(subscribed_to_id=creator_id).values('id')
+    return subscriber_ids[:TIMELINE_FANOUT_LIMIT + 1].count() > TIMELINE_FANOUT_LIMIT
+
+
+def refresh_large_creator(creator):
+    """
+    Update the creator's is_large_creator flag from their subscriber
+    count, backfilling their subscribers if they stopped being large.
+    Returns the flag.
+    """
+    large = over_fanout_limit(creator.id)
+    if large != creator.is_large_creator:
+        _set_large(creator.id, large)
+        creator.is_large_creator = large
+    return large
+
+
+def refresh_large_creators():
+    """
+    Recompute every creator's flag with one GROUP BY over the
+    subscriptions. Returns (flagged, unflagged) counts.
+    """
+    large = set(
+        Subscription.objects.values('subscribed_to')
+        .annotate(n=Count('id'))
+        .filter(n__gt=TIMELINE_FANOUT_LIMIT)
+        .values_list('subscribed_to', flat=True)
+    )
+    flagged = set(User.objects.filter(is_large_creator=True).values_list('id', flat=True))
+    for creator_id in large - flagged:
+        _set_large(creator_id, True)
+    for creator_id in flagged - large:
+        _set_large(creator_id, False)
+    return len(large - flagged), len(flagged - large)
+
+
+def _set_large(creator_id, large):
+    User.objects.filter(pk=creator_id).update(is_large_creator=large)
+    if not large:
+        # their posts were pulled at read time and never pushed; push them now
+        backfill_subscribers(creator_id)
+
+
+def trim_timelines(user_ids):
+    """
+    Cap timelines to TIMELINE_MAX_LENGTH entries. One GROUP BY finds the
+    users that have grown past the cap plus slack, so most calls only
+    cost a single query.
+    """
+    over_cap = (
+        TimelineEntry.objects.filter(user_id__in=user_ids)
+        .values('user_id')
+        .annotate(n=Count('id'))
+        .filter(n__gt=TIMELINE_MAX_LENGTH + TIMELINE_TRIM_SLACK)
+        .values_list('user_id', flat=True)
+    )
+    for user_id in list(over_cap):
+        entries = TimelineEntry.objects.filter(user_id=user_id)
+        cutoff = entries.values_list('created_at', 'post_id')[TIMELINE_MAX_LENGTH - 1]
+        entries.filter(
+            Q(created_at__lt=cutoff[0]) | Q(created_at=cutoff[0], post_id__lt=cutoff[1])
+        ).delete()
+
+
+def push_post(post, user_ids):
+    """
+    Push a new post into the timelines of `user_ids`, one chunk of the
+    creator's subscribers. Returns the number of timelines written to.
+    """
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post=post, created_at=post.created_at) for user_id in user_ids],
+        ignore_conflicts=True,
+    )
+    trim_timelines(user_ids)
+    return len(user_ids)
+
+
+def backfill_timeline(subscriber, creator):
+    """
+    Copy the creator's most recent posts into a new subscriber's timeline.
+    """
+    return backfill_creators(subscriber, [creator.id])
+
+
+def backfill_creators(subscriber, creator_ids):
+    """
+    backfill_timeline for several newly followed creators at once. Only
+    the newest TIMELINE_MAX_LENGTH posts across all of them can survive
+    trimming, so that's all that is copied.
+    """
+    creator_ids = set(creator_ids) - set(
+        User.objects.filter(pk__in=creator_ids, is_large_creator=True).values_list('id', flat=True)
+    )
+    if not creator_ids:
+        return 0
+    recent = Post.objects.filter(user_id__in=creator_ids).order_by('-created_at', '-id').values_list('id', 'created_at')
+    entries = [
+        TimelineEntry(user=subscriber, post_id=post_id, created_at=created_at)
+        for post_id, created_at in recent[:TIMELINE_MAX_LENGTH]
+    ]
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+    trim_timelines([subscriber.id])
+    return len(entries)
+
+
+def backfill_subscribers(creator_id):
+    """
+    Copy a creator's most recent posts into every subscriber's timeline,
+    for a creator that is no longer large. Returns the number of
+    timelines written to.
+    """
+    recent = list(
+        Post.objects.filter(user_id=creator_id).order_by('-created_at', '-id')
+        .values_list('id', 'created_at')[:TIMELINE_MAX_LENGTH]
+    )
+    if not recent:
+        return 0
+    subscriber_ids = Subscription.objects.filter(
+        subscribed_to_id=creator_id
+    ).order_by('id').values_list('subscriber_id', flat=True)
+
+    written = 0
+    batch = []
+    for subscriber_id in subscriber_ids.iterator(chunk_size=TIMELINE_BATCH_SIZE):
+        batch.append(subscriber_id)
+        if len(batch) >= TIMELINE_BATCH_SIZE:
+            written += _push_posts(recent, batch)
+            batch = []
+    if batch:
+        written += _push_posts(recent, batch)
+    return written
+
+
+def _push_posts(posts, user_ids):
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post_id=post_id, created_at=created_at)
+            for user_id in user_ids for post_id, created_at in posts
+        ],
+        ignore_conflicts=True, batch_size=TIMELINE_BATCH_SIZE,
+    )
+    trim_timelines(user_ids)
+    return len(user_ids)
+
+
+def remove_from_timeline(subscriber, creator):
+    """
+    Drop a creator's posts from a subscriber's timeline after unsubscribing.
+    """
+    return remove_creators(subscriber, [creator.id])
+
+
+def remove_creators(subscriber, creator_ids):
+    return TimelineEntry.objects.filter(user=subscriber, post__user_id__in=creator_ids).delete()[0]
+
+
+def timeline_page(user, after=None, limit=TIMELINE_MAX_LENGTH):
+    """
+    One page of the user's home timeline, newest first: the materialized
+    entries merged with posts pulled from followed large creators.
+    `after` is a decoded keyset position (see myapp.pagination).
+    """
+    entries = keyset_filter(TimelineEntry.objects.filter(user=user), after, id_field='post_id')
+    candidates = set(entries.values_list('created_at', 'post_id')[:limit])
+
+    pulled_ids = list(Subscription.objects.filter(
+        subscriber=user, subscribed_to__is_large_creator=True,
+    ).values_list('subscribed_to_id', flat=True))
+    if pulled_ids:
+        pulled = keyset_filter(Post.objects.filter(user_id__in=pulled_ids), after)
+        candidates.update(pulled.values_list('created_at', 'id')[:limit])
+
+    page = sorted(candidates, reverse=True)[:limit]
+    posts = Post.objects.in_bulk([post_id for _, post_id in page])
+    return [posts[post_id] for _, post_id in page if post_id in posts]
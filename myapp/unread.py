@@ -0,0 +1,96 @@
+"""
+Unread notification state.
+
+A notification is unread when its id is above the user's read watermark
+(NotificationReadMarker) and it has not been marked read individually, so
+"mark all read" is a single row write.
+
+The per-user unread count is kept in the Django cache. The dispatcher
+increments it as notifications are stored and mark-read resets it, so the
+badge endpoint never touches the Notification table on a cache hit. A cold
+or evicted key is rebuilt from the table on next read.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Notification, NotificationReadMarker
+
+UNREAD_COUNT_CACHE_TIMEOUT = getattr(settings, 'UNREAD_COUNT_CACHE_TIMEOUT', 60 * 60)
+
+
+def unread_cache_key(user_id):
+    return f"notifications:unread:{user_id}"
+
+
+def read_watermark(user_id):
+    marker = NotificationReadMarker.objects.filter(user_id=user_id).values_list('last_read_id', flat=True).first()
+    return marker or 0
+
+
+def read_watermarks(user_ids):
+    markers = dict(
+        NotificationReadMarker.objects.filter(user_id__in=user_ids).values_list('user_id', 'last_read_id')
+    )
+    return {user_id: markers.get(user_id, 0) for user_id in user_ids}
+
+
+def unread_queryset(user_id, watermark=None):
+    if watermark is None:
+        watermark = read_watermark(user_id)
+    return Notification.objects.filter(receiver_id=user_id, id__gt=watermark, is_read=False)
+
+
+def mark_all_read(user_id):
+    """
+    Move the watermark up to the user's newest notification.
+    """
+    latest_id = Notification.objects.filter(receiver_id=user_id).order_by('-id').values_list('id', flat=True).first()
+    if latest_id is not None:
+        NotificationReadMarker.objects.update_or_create(user_id=user_id, defaults={'last_read_id': latest_id})
+    reset_unread(user_id)
+
+
+def mark_read(user_id, notification_id):
+    """
+    Mark a single notification above the watermark as read.
+    Returns True if it was unread.
+    """
+    updated = unread_queryset(user_id).filter(pk=notification_id).update(is_read=True)
+    if updated:
+        incr_unread({user_id: -1})
+    return bool(updated)
+
+
+def get_unread_count(user_id):
+    count = cache.get(unread_cache_key(user_id))
+    if count is None:
+        count = reconcile_unread_count(user_id)
+    return count
+
+
+def reconcile_unread_count(user_id):
+    """
+    Recount from the table and store the result. `add` keeps an increment
+    that raced in after the count instead of overwriting it.
+    """
+    count = unread_queryset(user_id).count()
+    cache.add(unread_cache_key(user_id), count, UNREAD_COUNT_CACHE_TIMEOUT)
+    return count
+
+
+def incr_unread(counts):
+    """
+    Add to the counters of several users, e.g. {receiver_id: 3}.
+    Users without a cached counter are skipped; they are recounted on read.
+    """
+    for user_id, delta in counts.items():
+        if not delta:
+            continue
+        try:
+            cache.incr(unread_cache_key(user_id), delta)
+        except ValueError:
+            pass
+
+
+def reset_unread(user_id):
+    cache.set(unread_cache_key(user_id), 0, UNREAD_COUNT_CACHE_TIMEOUT)
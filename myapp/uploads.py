@@ -0,0 +1,285 @@
+"""
+Chunked, resumable media uploads with content-addressed storage.
+
+A client starts an upload, then appends chunks at the offset the server
+reports, resuming from that offset after a dropped connection. Chunks
+are streamed from the request to a partial file in CHUNKED_UPLOAD_DIR in
+READ_SIZE pieces, never held in memory whole. Finalizing hashes the file
+and stores it once per SHA-256 under uploads/blobs/; uploading the same
+bytes again reuses the existing MediaBlob.
+
+The SHA-256 is computed while chunks stream in. Hash state can't be
+persisted, so it lives in a process-local cache; if appends land on
+different workers, or the state was evicted, finalize re-reads the
+partial file instead.
+
+Appending and finalizing first claim the upload by moving it from open
+to appending or finalizing with a conditional UPDATE on status and
+offset, so only one request at a time writes, truncates or hashes the
+partial file; an overlapping request gets UploadConflict (409). Uploads
+left unfinalized for CHUNKED_UPLOAD_EXPIRY seconds, including ones whose
+claim was never released because a worker died, are deleted with their
+partial files by `python manage.py purge_uploads`.
+"""
+import hashlib
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import IntegrityError
+from django.http import UnreadablePostError
+from django.utils import timezone
+
+from .models import MediaBlob, Upload
+from .user_cache import TTLCache
+
+CHUNKED_UPLOAD_DIR = getattr(settings, 'CHUNKED_UPLOAD_DIR', os.path.join(settings.BASE_DIR, 'uploads', 'partial'))
+CHUNKED_UPLOAD_CHUNK_SIZE = getattr(settings, 'CHUNKED_UPLOAD_CHUNK_SIZE', 5 * 1024 * 1024)
+CHUNKED_UPLOAD_MAX_SIZE = getattr(settings, 'CHUNKED_UPLOAD_MAX_SIZE', 2 * 1024 * 1024 * 1024)
+CHUNKED_UPLOAD_EXPIRY = getattr(settings, 'CHUNKED_UPLOAD_EXPIRY', 24 * 60 * 60)
+UPLOAD_BLOB_PREFIX = 'uploads/blobs'
+
+READ_SIZE = 64 * 1024
+
+# upload id -> (offset, running sha256 of the bytes before it)
+hashers = TTLCache(1000, CHUNKED_UPLOAD_EXPIRY)
+
+
+class UploadError(ValueError):
+    pass
+
+
+class UploadConflict(UploadError):
+    pass
+
+
+class OffsetMismatch(UploadError):
+    def __init__(self, offset):
+        super().__init__(f"Upload is at offset {offset}")
+        self.offset = offset
+
+
+def partial_path(upload):
+    return os.path.join(CHUNKED_UPLOAD_DIR, f"{upload.pk}.part")
+
+
+def blob_name(digest, filename):
+    ext = os.path.splitext(filename)[1].lower()
+    if not (ext[1:].isalnum() and len(ext) <= 10):
+        ext = ''
+    return f"{UPLOAD_BLOB_PREFIX}/{digest[:2]}/{digest}{ext}"
+
+
+def start_upload(user, filename, content_type='', size=None):
+    if size is not None and (size <= 0 or size > CHUNKED_UPLOAD_MAX_SIZE):
+        raise UploadError(f"size must be between 1 and {CHUNKED_UPLOAD_MAX_SIZE} bytes")
+    upload = Upload.objects.create(
+        user=user, filename=os.path.basename(filename)[:255], content_type=content_type[:100], size=size,
+    )
+    os.makedirs(CHUNKED_UPLOAD_DIR, exist_ok=True)
+    open(partial_path(upload), 'wb').close()
+    hashers.set(str(upload.pk), (0, hashlib.sha256()))
+    return upload
+
+
+def append_chunk(upload, start, stream):
+    """
+    Stream the chunk in `stream` (anything with .read(n), or None for an
+    empty chunk) into the upload at byte `start`, which must be the
+    current offset. If the client disconnects mid-chunk, the bytes that
+    arrived are kept. Returns the new offset.
+    """
+    if upload.status != Upload.OPEN:
+        raise UploadConflict(f"Upload is {upload.status}")
+    if start != upload.offset:
+        raise OffsetMismatch(upload.offset)
+    if not _claim(upload, Upload.APPENDING):
+        # another request is appending or finalizing, or appended first; the client has to re-sync
+        if upload.status != Upload.OPEN:
+            raise UploadConflict(f"Upload is {upload.status}")
+        raise OffsetMismatch(upload.offset)
+    try:
+        offset = _write_chunk(upload, start, stream)
+    except BaseException:
+        Upload.objects.filter(pk=upload.pk, status=Upload.APPENDING).update(status=Upload.OPEN)
+        upload.status = Upload.OPEN
+        raise
+    released = Upload.objects.filter(pk=upload.pk, status=Upload.APPENDING).update(
+        status=Upload.OPEN, offset=offset, updated_at=timezone.now(),
+    )
+    if not released:
+        raise UploadConflict("Upload has expired")
+    upload.status, upload.offset = Upload.OPEN, offset
+    return offset
+
+
+def _claim(upload, status):
+    """
+    Move the upload from open to `status` if it's still at the offset we
+    hold, so only one request at a time touches its partial file. On
+    failure the upload is reloaded and False returned.
+    """
+    claimed = Upload.objects.filter(pk=upload.pk, offset=upload.offset, status=Upload.OPEN).update(
+        status=status, updated_at=timezone.now(),
+    )
+    if claimed:
+        upload.status = status
+        return True
+    _reload(upload)
+    return False
+
+
+def _write_chunk(upload, start, stream):
+    key = str(upload.pk)
+    entry = hashers.pop(key)
+    hasher = entry[1] if entry and entry[0] == start else None
+    limit = upload.size if upload.size is not None else CHUNKED_UPLOAD_MAX_SIZE
+    written = 0
+    with open(partial_path(upload), 'r+b') as f:
+        # drop bytes past the offset left behind by an earlier failed chunk
+        f.seek(start)
+        f.truncate()
+        while stream is not None:
+            try:
+                data = stream.read(READ_SIZE)
+            except UnreadablePostError:
+                break
+            if not data:
+                break
+            if start + written + len(data) > limit:
+                raise UploadError(f"Upload exceeds {limit} bytes")
+            f.write(data)
+            written += len(data)
+            if hasher:
+                hasher.update(data)
+
+    offset = start + written
+    if hasher:
+        hashers.set(key, (offset, hasher))
+    return offset
+
+
+def _reload(upload):
+    try:
+        upload.refresh_from_db(fields=['offset', 'status', 'blob'])
+    except Upload.DoesNotExist:
+        raise UploadConflict("Upload has expired")
+
+
+def hash_file(path, size):
+    hasher = hashlib.sha256()
+    remaining = size
+    with open(path, 'rb') as f:
+        while remaining:
+            data = f.read(min(READ_SIZE, remaining))
+            if not data:
+                break
+            hasher.update(data)
+            remaining -= len(data)
+    return hasher.hexdigest()
+
+
+def store_blob(path, name):
+    """
+    Move the partial file into storage as `name`.
+    """
+    try:
+        target = default_storage.path(name)
+    except NotImplementedError:
+        # remote storage: copy up, then drop the local file
+        with open(path, 'rb') as f:
+            default_storage.save(name, File(f))
+        os.remove(path)
+        return
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(path, target)
+
+
+def finalize_upload(upload):
+    """
+    Hash the received bytes and link the upload to the blob holding them,
+    storing a new blob only if these bytes haven't been seen before.
+    Returns (blob, created). Raises UploadConflict while another request
+    is finalizing it, OffsetMismatch if a chunk landed meanwhile.
+    """
+    if upload.finalized:
+        return upload.blob, False
+    if upload.offset == 0:
+        raise UploadError("Upload is empty")
+    if upload.size is not None and upload.offset != upload.size:
+        raise UploadError(f"Expected {upload.size} bytes, received {upload.offset}")
+
+    if not _claim(upload, Upload.FINALIZING):
+        if upload.finalized:
+            return upload.blob, False
+        if upload.status != Upload.OPEN:
+            raise UploadConflict(f"Upload is {upload.status}")
+        raise OffsetMismatch(upload.offset)
+    try:
+        blob, created = _finalize_claimed(upload)
+    except BaseException:
+        Upload.objects.filter(pk=upload.pk, status=Upload.FINALIZING).update(status=Upload.OPEN)
+        upload.status = Upload.OPEN
+        raise
+    Upload.objects.filter(pk=upload.pk).update(blob=blob, status=Upload.FINALIZED, updated_at=timezone.now())
+    upload.blob, upload.status = blob, Upload.FINALIZED
+    return blob, created
+
+
+def _finalize_claimed(upload):
+    path = partial_path(upload)
+    with open(path, 'r+b') as f:
+        f.truncate(upload.offset)
+    entry = hashers.pop(str(upload.pk))
+    digest = entry[1].hexdigest() if entry and entry[0] == upload.offset else hash_file(path, upload.offset)
+
+    blob = MediaBlob.objects.filter(sha256=digest).first()
+    created = blob is None
+    if created:
+        name = blob_name(digest, upload.filename)
+        store_blob(path, name)
+        try:
+            blob = MediaBlob.objects.create(
+                sha256=digest, size=upload.offset, content_type=upload.content_type, file=name,
+            )
+        except IntegrityError:
+            # same bytes finalized concurrently
+            blob, created = MediaBlob.objects.get(sha256=digest), False
+    else:
+        os.remove(path)
+    return blob, created
+
+
+def purge_abandoned(older_than=CHUNKED_UPLOAD_EXPIRY, dry_run=False):
+    """
+    Delete uploads left unfinalized for `older_than` seconds, and partial
+    files that belong to no unfinalized upload and haven't been written
+    to for as long. Returns (uploads, files) deleted, or that would be.
+    """
+    cutoff = timezone.now() - timedelta(seconds=older_than)
+    abandoned = Upload.objects.filter(blob__isnull=True, updated_at__lt=cutoff)
+    if dry_run:
+        uploads = abandoned.count()
+        live = Upload.objects.filter(blob__isnull=True).exclude(pk__in=abandoned.values('pk'))
+    else:
+        uploads = abandoned.delete()[1].get(Upload._meta.label, 0)
+        live = Upload.objects.filter(blob__isnull=True)
+    live = {str(pk) for pk in live.values_list('pk', flat=True)}
+
+    files = 0
+    if os.path.isdir(CHUNKED_UPLOAD_DIR):
+        for entry in os.scandir(CHUNKED_UPLOAD_DIR):
+            name, ext = os.path.splitext(entry.name)
+            if ext != '.part' or name in live or not entry.is_file():
+                continue
+            try:
+                if entry.stat().st_mtime >= cutoff.timestamp():
+                    continue  # an upload started after the query above
+                if not dry_run:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            files += 1
+    return uploads, files
@@ -8,13 +8,29 @@ urlpatterns = [
     path('creator-update/', CreatorUpdate.as_view(), name='creator-update'),
     path('create-post/', CreatorPost.as_view(), name='create-post'),
     path('create-post/<int:pk>/', CreatorPost.as_view(), name='update-post'),
+    path('uploads/', UploadCreateView.as_view(), name='upload-create'),
+    path('uploads/<uuid:pk>/', UploadDetailView.as_view(), name='upload-detail'),
+    path('uploads/<uuid:pk>/finalize/', UploadFinalizeView.as_view(), name='upload-finalize'),
+    path('uploads/<path:name>', MediaView.as_view(), name='media'),
     path('post-reaction/<int:pk>/', PostReactionView.as_view(), name='post-reaction'),
+    path('reactions/batch/', ReactionBatchView.as_view(), name='reaction-batch'),
     path('post-comment/<int:pk>/', PostCommentView.as_view(), name='post-comment'),
+    path('posts/<int:pk>/comments/', PostCommentListView.as_view(), name='post-comments'),
     path('subscribe/<int:pk>/', SubscribeView.as_view(), name='subscribe'),
     path('unsubscribe/<int:pk>/', UnsubscribeView.as_view(), name='unsubscribe'),
+    path('users/<int:pk>/followers/', FollowListView.as_view(direction=FOLLOWERS), name='user-followers'),
+    path('users/<int:pk>/following/', FollowListView.as_view(direction=FOLLOWING), name='user-following'),
+    path('users/<int:pk>/follow-counts/', FollowCountsView.as_view(), name='user-follow-counts'),
+    path('follows/check/', FollowCheckView.as_view(), name='follow-check'),
+    path('follows/bulk/', FollowBulkView.as_view(), name='follow-bulk'),
     path('feed/', UserFeedView.as_view(), name='user-feed'),
+    path('search/', SearchView.as_view(), name='search'),
     path('notifications/', NotificationListAPIView.as_view(), name='notifications-list'),
+    path('notifications/unread-count/', NotificationUnreadCountAPIView.as_view(), name='notifications-unread-count'),
     path('notifications/mark-all/', NotificationMarkAllReadAPIView.as_view(), name='notifications-mark-all'),
+    path('stats/auth-cache/', AuthCacheStatsAPIView.as_view(), name='auth-cache-stats'),
+    path('stats/websockets/', WebSocketStatsAPIView.as_view(), name='websocket-stats'),
+    path('notifications/<int:pk>/read/', NotificationMarkReadAPIView.as_view(), name='notifications-mark-read'),
     
 ]
 
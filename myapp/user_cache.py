@@ -0,0 +1,185 @@
+"""
+Caches for authentication.
+
+`user_cache` maps user id to a trimmed-down User instance and
+`token_cache` remembers recently verified JWTs, so reconnect storms and hot
+endpoints don't turn into one decode plus one User SELECT per connection or
+request. Both are process-local: entries expire after a TTL and the least
+recently used ones are evicted first.
+
+Behind the process-local user cache sits the shared Django cache, so a miss
+in one worker is usually served without the database. Saving or deleting a
+user drops it from both layers (see signals.py); other processes drop their
+local copy within USER_CACHE_TTL. The shared layer is skipped when the
+cache backend isn't shared between processes (locmem, dummy): another
+worker's invalidation couldn't reach it, and its entries would outlive a
+change by SHARED_USER_CACHE_TTL.
+"""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+USER_CACHE_SIZE = getattr(settings, 'USER_CACHE_SIZE', 10000)
+USER_CACHE_TTL = getattr(settings, 'USER_CACHE_TTL', 30)
+SHARED_USER_CACHE_TTL = getattr(settings, 'SHARED_USER_CACHE_TTL', 300)
+TOKEN_CACHE_SIZE = getattr(settings, 'TOKEN_CACHE_SIZE', 10000)
+TOKEN_CACHE_TTL = getattr(settings, 'TOKEN_CACHE_TTL', 300)
+
+# Everything but the password hash and rarely used columns
+USER_CACHE_FIELDS = [
+    'id', 'email', 'name', 'is_active', 'is_admin', 'is_creator', 'is_viewer', 'created_at', 'updated_at',
+]
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire after `ttl` seconds.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self.data[key]
+                self.misses += 1
+                return default
+            self.data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = (time.monotonic() + self.ttl, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key):
+        with self.lock:
+            entry = self.data.pop(key, None)
+        return entry[1] if entry else None
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+token_cache = TTLCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL)
+
+
+def user_key(user_id):
+    # JWT claims carry the id as a string, model instances as an int
+    return str(user_id)
+
+
+def shared_user_key(user_id):
+    return f"auth:user:{user_id}"
+
+
+def shared_layer_enabled():
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def load_user(user_id):
+    """
+    Fetch the cacheable projection of a user, or None.
+    """
+    from django.contrib.auth import get_user_model
+    User = get_user_model()
+    return User.objects.only(*USER_CACHE_FIELDS).filter(pk=user_id).first()
+
+
+def cached_user(user_id):
+    """
+    Copy of the cached user without touching the database, or None on a miss.
+    Callers get their own copy so request-level mutations don't leak.
+    """
+    user = user_cache.get(user_key(user_id))
+    return copy.copy(user) if user is not None else None
+
+
+def fetch_user(user_id):
+    """
+    Load a user from the shared cache, or the database on a shared miss,
+    into the local cache. None if it doesn't exist.
+    """
+    shared = shared_layer_enabled()
+    user = cache.get(shared_user_key(user_id)) if shared else None
+    if user is None:
+        user = load_user(user_id)
+        if user is None:
+            return None
+        if shared:
+            cache.set(shared_user_key(user_id), user, SHARED_USER_CACHE_TTL)
+    user_cache.set(user_key(user_id), user)
+    return copy.copy(user)
+
+
+def get_user(user_id):
+    """
+    Cached user, loading and caching it on a miss.
+    """
+    user = cached_user(user_id)
+    return user if user is not None else fetch_user(user_id)
+
+
+def invalidate_user(user_id):
+    user_cache.pop(user_key(user_id))
+    cache.delete(shared_user_key(user_id))
+
+
+def token_key(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def verified_token_user_id(token):
+    """
+    User id of a token that was verified recently and has not expired since.
+    """
+    entry = token_cache.get(token_key(token))
+    if entry is None:
+        return None
+    user_id, expires_at = entry
+    if expires_at is not None and expires_at <= time.time():
+        token_cache.pop(token_key(token))
+        return None
+    return user_id
+
+
+def remember_token(token, user_id, expires_at):
+    token_cache.set(token_key(token), (user_id, expires_at))
+
+
+def cache_stats():
+    return {'users': user_cache.stats(), 'tokens': token_cache.stats()}
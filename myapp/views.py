@@ -10,8 +10,9 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.permissions import IsAuthenticated
 from rest_framework_simplejwt.exceptions import AuthenticationFailed
 from rest_framework import permissions
-from rest_framework.permissions import BasePermission, SAFE_METHODS
+from rest_framework.permissions import BasePermission, SAFE_METHODS, IsAdminUser
 from django.shortcuts import get_object_or_404
+from django.db import IntegrityError, transaction
 from django.contrib.auth.hashers import make_password
 from django.core.mail import send_mail
 from django.contrib.auth import authenticate
@@ -21,6 +22,31 @@ from rest_framework.response import Response
 from django.core.cache.backends.base import DEFAULT_TIMEOUT
 from django.core.cache import cache
 from django.views.decorators.cache import cache_page
+from .timeline import backfill_timeline, remove_from_timeline, timeline_page
+from .user_cache import cache_stats as user_cache_stats, get_user
+from .consumers import connection_stats as websocket_connection_stats
+from .fanout import enqueue_post_fanout
+from .unread import get_unread_count, mark_all_read, mark_read, read_watermark, unread_queryset
+from .pagination import CursorError, encode_cursor, keyset_filter, page_params, position_of
+from .post_cache import (
+    creator_posts, creator_version, get_versions, hot_posts, last_modified, render_posts, version_key,
+)
+from .conditional import make_etag, not_modified, set_validators
+from .media import serve as serve_media
+from .search import SearchError, search, search_enabled
+from .follows import (
+    FOLLOW_BULK_MAX_IDS, FOLLOWERS, FOLLOWING, FollowError, adjacency, adjacency_page, bulk_follow,
+    follow_counts, is_following,
+)
+from .reactions import ReactionBatchError, apply_reaction_batch
+from .reaction_buffer import (
+    buffer as reaction_buffer, buffer_reaction_batch, merge_counts, reaction_state, toggle_reaction,
+    write_behind_enabled,
+)
+from .uploads import (
+    CHUNKED_UPLOAD_CHUNK_SIZE, CHUNKED_UPLOAD_MAX_SIZE, OffsetMismatch, UploadConflict, UploadError,
+    append_chunk, finalize_upload, start_upload,
+)
 
 # Create your views here.
 
@@ -94,11 +120,13 @@ class CreatorPost(APIView):
 
     def post(self, request):
         user = request.user
-        serializer = PostSerializer(data=request.data)
+        serializer = PostSerializer(data=request.data, context={'request': request})
         # Check if user is a creator
         if user.is_creator:
             if serializer.is_valid():
-                serializer.save(user=user)
+                post = serializer.save(user=user)
+                # the fan-out worker pushes it into subscribers' timelines and notifies them
+                enqueue_post_fanout(post)
                 return Response(
                     {"message": "Post created successfully", "data": serializer.data},
                     status=status.HTTP_201_CREATED
@@ -111,9 +139,15 @@ class CreatorPost(APIView):
     def get(self,request):
         user = request.user
         if user.is_creator:
-            posts = Post.objects.filter(user=user)
-            serializer = UserPostSerializer(posts, many=True)
-            return Response({"message": "Posts fetched successfully", "data": serializer.data}, status=status.HTTP_200_OK)
+            version = creator_version(user.id)
+            etag = make_etag('creator-posts', user.id, version)
+            modified = last_modified(Post.objects.filter(user_id=user.id), [version])
+            cached_response = not_modified(request, etag, modified)
+            if cached_response is not None:
+                return cached_response
+            data = creator_posts(user.id, UserPostSerializer, version)
+            response = Response({"message": "Posts fetched successfully", "data": data}, status=status.HTTP_200_OK)
+            return set_validators(response, etag, modified)
         else:
             return Response({"message": "You are not authorized to perform this action."}, status=status.HTTP_403_FORBIDDEN)
 
@@ -121,7 +155,7 @@ class CreatorPost(APIView):
         user = request.user
         post = get_object_or_404(Post, pk=pk)
         if user.is_creator and post.user == user:
-            serializer = PostSerializer(post, data=request.data, partial=True)
+            serializer = PostSerializer(post, data=request.data, partial=True, context={'request': request})
             if serializer.is_valid():
                 serializer.save()
                 return Response({"message": "Post updated successfully", "data": serializer.data}, status=status.HTTP_200_OK)
@@ -138,6 +172,105 @@ class CreatorPost(APIView):
         else:
             return Response({"message": "You are not authorized to perform this action."}, status=status.HTTP_403_FORBIDDEN)
         
+class UploadCreateView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        """
+        Start a chunked upload: {"filename", "size" (optional), "content_type" (optional)}.
+        """
+        if not request.user.is_creator:
+            return Response({"message": "You are not authorized to perform this action."}, status=status.HTTP_403_FORBIDDEN)
+        filename = request.data.get('filename')
+        if not filename:
+            return Response({"message": "filename is required"}, status=status.HTTP_400_BAD_REQUEST)
+        size = request.data.get('size')
+        try:
+            upload = start_upload(
+                request.user, filename,
+                content_type=request.data.get('content_type') or '',
+                size=int(size) if size not in (None, '') else None,
+            )
+        except (UploadError, ValueError) as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            "upload_id": upload.pk,
+            "offset": upload.offset,
+            "chunk_size": CHUNKED_UPLOAD_CHUNK_SIZE,
+            "max_size": CHUNKED_UPLOAD_MAX_SIZE,
+        }, status=status.HTTP_201_CREATED)
+
+class UploadDetailView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        """
+        Current offset, to resume an interrupted upload.
+        """
+        upload = get_object_or_404(Upload.objects.select_related('blob'), pk=pk, user=request.user)
+        return Response({
+            "upload_id": upload.pk,
+            "offset": upload.offset,
+            "size": upload.size,
+            "finalized": upload.finalized,
+            "sha256": upload.blob.sha256 if upload.blob else None,
+        })
+
+    def put(self, request, pk):
+        """
+        Append the raw request body at the offset given in the
+        Upload-Offset header (or ?offset=), which must match the server's.
+        """
+        upload = get_object_or_404(Upload, pk=pk, user=request.user)
+        try:
+            start = int(request.headers.get('Upload-Offset', request.query_params.get('offset', '')))
+        except ValueError:
+            return Response({"message": "Upload-Offset header is required"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            offset = append_chunk(upload, start, request.stream)
+        except OffsetMismatch as e:
+            return Response({"message": str(e), "offset": e.offset}, status=status.HTTP_409_CONFLICT)
+        except UploadConflict as e:
+            return Response({"message": str(e), "offset": upload.offset}, status=status.HTTP_409_CONFLICT)
+        except UploadError as e:
+            return Response({"message": str(e), "offset": upload.offset}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        return Response({"upload_id": upload.pk, "offset": offset})
+
+class UploadFinalizeView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk):
+        """
+        Finish the upload. Pass the returned upload_id to create-post/.
+        """
+        upload = get_object_or_404(Upload.objects.select_related('blob'), pk=pk, user=request.user)
+        try:
+            blob, created = finalize_upload(upload)
+        except OffsetMismatch as e:
+            return Response({"message": str(e), "offset": e.offset}, status=status.HTTP_409_CONFLICT)
+        except UploadConflict as e:
+            return Response({"message": str(e), "offset": upload.offset}, status=status.HTTP_409_CONFLICT)
+        except UploadError as e:
+            return Response({"message": str(e), "offset": upload.offset}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            "upload_id": upload.pk,
+            "sha256": blob.sha256,
+            "size": blob.size,
+            "deduplicated": not created,
+        })
+
+class MediaView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, name):
+        """
+        A post's file or image variant, with Range and conditional GET support.
+        """
+        response = serve_media(request, f"uploads/{name}")
+        if response is None:
+            return Response({"message": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+        return response
+
 class PostReactionView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -149,18 +282,56 @@ class PostReactionView(APIView):
         if reaction_type not in ['like', 'dislike']:
             return Response({"message": "Invalid reaction type"}, status=status.HTTP_400_BAD_REQUEST)
 
-        reaction, created = Reaction.objects.get_or_create(post=post, user=user, defaults={'reaction_type': reaction_type})
+        if write_behind_enabled():
+            if toggle_reaction(post, user, reaction_type) is None:
+                return Response({"message": f"{reaction_type.capitalize()} removed"}, status=status.HTTP_200_OK)
+            return Response({"message": f"{reaction_type.capitalize()} added"}, status=status.HTTP_200_OK)
+
+        with transaction.atomic():
+            reaction, created = Reaction.objects.get_or_create(post=post, user=user, defaults={'reaction_type': reaction_type})
 
-        if not created:
-            if reaction.reaction_type == reaction_type:
+            if created:
+                Post.bump_counters(post.id, **{Reaction.COUNTER_FIELDS[reaction_type]: 1})
+            elif reaction.reaction_type == reaction_type:
                 reaction.delete()
+                Post.bump_counters(post.id, **{Reaction.COUNTER_FIELDS[reaction_type]: -1})
                 return Response({"message": f"{reaction_type.capitalize()} removed"}, status=status.HTTP_200_OK)
             else:
+                previous = reaction.reaction_type
                 reaction.reaction_type = reaction_type
                 reaction.save()
+                Post.bump_counters(post.id, **{
+                    Reaction.COUNTER_FIELDS[previous]: -1,
+                    Reaction.COUNTER_FIELDS[reaction_type]: 1,
+                })
 
         return Response({"message": f"{reaction_type.capitalize()} added"}, status=status.HTTP_200_OK)
 
+    def get(self, request, pk):
+        """
+        The post's like/dislike counts and the user's own reaction,
+        including reactions still in the write-behind buffer.
+        """
+        post = get_object_or_404(Post.objects.only('id', 'like_count', 'dislike_count'), pk=pk)
+        return Response(reaction_state(post, request.user), status=status.HTTP_200_OK)
+
+class ReactionBatchView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        """
+        Apply many reactions at once: a list (or {"reactions": [...]}) of
+        {"post_id", "reaction_type", "action": "set" | "remove"}.
+        Returns one result per item, in order.
+        """
+        items = request.data.get('reactions') if isinstance(request.data, dict) else request.data
+        try:
+            apply = buffer_reaction_batch if write_behind_enabled() else apply_reaction_batch
+            results = apply(request.user, items)
+        except ReactionBatchError as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
 class PostCommentView(APIView):
 
     permission_classes = [IsAuthenticated]
@@ -173,7 +344,9 @@ class PostCommentView(APIView):
         if not comment_text:
             return Response({"error": "Content is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        Comment.objects.create(post=post, user=user, content=comment_text)
+        with transaction.atomic():
+            Comment.objects.create(post=post, user=user, content=comment_text)
+            Post.bump_counters(post.id, comment_count=1)
         return Response({"message": "Comment added successfully"}, status=status.HTTP_201_CREATED)
 
     def patch(self, request, pk):
@@ -206,26 +379,56 @@ class PostCommentView(APIView):
         user = request.user
         comment = get_object_or_404(Comment, pk=pk)
         if user == comment.user:
-            comment.delete()
+            with transaction.atomic():
+                # a concurrent delete of the same comment must not decrement twice
+                _, deleted = Comment.objects.filter(pk=comment.pk).delete()
+                if deleted.get(Comment._meta.label):
+                    Post.bump_counters(comment.post_id, comment_count=-1)
             return Response({"message": "Comment deleted successfully"}, status=status.HTTP_204_NO_CONTENT)
         else:
             return Response({"message": "You are not authorized to perform this action."}, status=status.HTTP_403_FORBIDDEN)
 
+class PostCommentListView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        """
+        Full comment thread of a post, oldest first, with keyset pagination.
+        """
+        post = get_object_or_404(Post.objects.only('id'), pk=pk)
+        try:
+            cursor, limit = page_params(request)
+        except CursorError as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        comments = keyset_filter(post.comments.select_related('user'), cursor, descending=False)
+        comments = list(comments[:limit + 1])
+        next_cursor = None
+        if len(comments) > limit:
+            comments = comments[:limit]
+            next_cursor = encode_cursor(position_of(comments[-1].created_at, comments[-1].id))
+
+        serializer = CommentSerializer(comments, many=True)
+        return Response({"results": serializer.data, "next_cursor": next_cursor})
+
 class SubscribeView(APIView):
 
     permission_classes = [IsAuthenticated]
 
     def post(self, request, pk):
         user = request.user
-        try:
-            subscribed_to = User.objects.get(pk=pk)
-        except User.DoesNotExist:
+        # usually a cache hit (user_cache.py)
+        subscribed_to = get_user(pk)
+        if subscribed_to is None:
             return Response({'detail': 'User not found.'}, status=404)
 
-        if Subscription.objects.filter(subscriber=user, subscribed_to=subscribed_to).exists():
+        # the unique constraint decides, not the cached adjacency entry, which may be stale
+        try:
+            with transaction.atomic():
+                Subscription.objects.create(subscriber=user, subscribed_to=subscribed_to)
+        except IntegrityError:
             return Response({'detail': 'Already subscribed.'}, status=400)
-
-        Subscription.objects.create(subscriber=user, subscribed_to=subscribed_to)
+        backfill_timeline(user, subscribed_to)
         return Response({'detail': 'Subscription created successfully.'}, status=201)
     
 class UnsubscribeView(APIView):
@@ -239,52 +442,220 @@ class UnsubscribeView(APIView):
             return Response({'detail': 'User not found.'}, status=404)
 
         Subscription.objects.filter(subscriber=user, subscribed_to=subscribed_to).delete()
+        remove_from_timeline(user, subscribed_to)
         return Response({'detail': 'Subscription deleted successfully.'}, status=204)
     
-class UserFeedView(APIView):
+class FollowListView(APIView):
     permission_classes = [IsAuthenticated]
+    direction = FOLLOWERS
 
-    def get(self, request):
-        user = request.user
+    def get(self, request, pk):
+        """
+        A user's followers (or the users they follow), most recent first,
+        each with whether the requesting user follows them. Pass
+        `next_cursor` back as `?cursor=` to fetch the following page.
+        """
+        if get_user(pk) is None:
+            return Response({"message": "User not found."}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            cursor, limit = page_params(request)
+            if cursor and not isinstance(cursor.get('id'), int):
+                raise CursorError("Invalid cursor")
+        except CursorError as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        page = adjacency_page(self.direction, pk, cursor['id'] if cursor else None, limit + 1)
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            next_cursor = encode_cursor({'id': page[-1][0]})
+
+        user_ids = [user_id for _, user_id in page]
+        users = User.objects.filter(pk__in=user_ids, is_active=True).only('id', 'name', 'is_creator').in_bulk()
+        following = is_following(request.user.id, user_ids)
+        results = [
+            {"id": user_id, "name": users[user_id].name, "is_creator": users[user_id].is_creator,
+             "is_following": following[user_id]}
+            for user_id in user_ids if user_id in users
+        ]
+        return Response({
+            "count": adjacency(self.direction, pk)['count'],
+            "results": results,
+            "next_cursor": next_cursor,
+        })
 
-        # 1 Get IDs of users this user is subscribed to (following)
-        subscribed_ids = Subscription.objects.filter(subscriber=user).values_list('subscribed_to', flat=True)
+class FollowCountsView(APIView):
+    permission_classes = [IsAuthenticated]
 
-        # 2 Posts from subscribed users (top priority)
-        posts_from_subscribed = Post.objects.filter(user_id__in=subscribed_ids)
+    def get(self, request, pk):
+        if get_user(pk) is None:
+            return Response({"message": "User not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(follow_counts(pk))
 
-        # 3 Recent posts (not from subscribed users)
-        recent_posts = Post.objects.exclude(user_id__in=subscribed_ids).order_by('-created_at')[:20]
+class FollowCheckView(APIView):
+    permission_classes = [IsAuthenticated]
 
-        # 4 Combine them in priority order
-        final_posts = list(posts_from_subscribed) + list(recent_posts)
+    def get(self, request):
+        """
+        Whether the requesting user follows each of ?ids=1,2,3.
+        """
+        try:
+            user_ids = list(dict.fromkeys(int(i) for i in request.query_params.get('ids', '').split(',') if i))
+        except ValueError:
+            return Response({"message": "ids must be a comma-separated list of user ids"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(user_ids) > FOLLOW_BULK_MAX_IDS:
+            return Response({"message": f"At most {FOLLOW_BULK_MAX_IDS} ids"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"results": {str(user_id): followed for user_id, followed in is_following(request.user.id, user_ids).items()}})
+
+class FollowBulkView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        """
+        Follow and unfollow many users at once:
+        {"follow": [user ids], "unfollow": [user ids]}.
+        """
+        data = request.data if isinstance(request.data, dict) else {}
+        try:
+            statuses = bulk_follow(request.user, data.get('follow'), data.get('unfollow'))
+        except FollowError as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"results": {str(user_id): result for user_id, result in statuses.items()}})
 
-        # 5 Remove duplicates while preserving order
-        seen = set()
-        unique_posts = []
-        for post in final_posts:
-            if post.id not in seen:
-                seen.add(post.id)
-                unique_posts.append(post)
+class UserFeedView(APIView):
+    permission_classes = [IsAuthenticated]
 
-        # 6 Serialize and return
-        serializer = feedSerializer(unique_posts, many=True)
-        return Response(serializer.data)
+    def get(self, request):
+        """
+        Feed with keyset pagination: posts from subscribed creators first,
+        newest first, then posts from everyone else ranked by hot score.
+        Pass `next_cursor` back as `?cursor=` to fetch the following page.
+        """
+        user = request.user
+        try:
+            cursor, limit = page_params(request)
+        except CursorError as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        section = cursor.get('s', 'subscribed') if cursor else 'subscribed'
+        posts = []
+        post_ids = []
+        next_cursor = None
+
+        # 1 Posts from subscribed users (top priority), read from the materialized timeline
+        if section == 'subscribed':
+            posts = timeline_page(user, cursor, limit + 1)
+            if len(posts) > limit:
+                posts = posts[:limit]
+                next_cursor = {'s': 'subscribed', **position_of(posts[-1].created_at, posts[-1].id)}
+            else:
+                section, cursor = 'recent', None
+            post_ids = [post.id for post in posts]
+
+        # 2 Posts from everyone else, ranked by hot score, fill the rest of the page,
+        # from the cached top-ranked index while it reaches far enough
+        if section == 'recent':
+            remaining = limit - len(post_ids)
+            if remaining == 0:
+                next_cursor = {'s': 'recent'}
+            else:
+                subscribed_ids = set(Subscription.objects.filter(subscriber=user).values_list('subscribed_to', flat=True))
+                recent = hot_posts(subscribed_ids, cursor, remaining + 1)
+                if recent is None:
+                    recent = list(
+                        keyset_filter(Post.objects.exclude(user_id__in=subscribed_ids), cursor, field='hot_score', key='h')
+                        .values_list('hot_score', 'id')[:remaining + 1]
+                    )
+                if len(recent) > remaining:
+                    recent = recent[:remaining]
+                    next_cursor = {'s': 'recent', 'h': recent[-1][0], 'id': recent[-1][1]}
+                post_ids += [post_id for _, post_id in recent]
+
+        # 3 Answer 304 if the page and every post on it are unchanged since the client's copy
+        next_cursor = encode_cursor(next_cursor) if next_cursor else None
+        version_keys = [version_key('post', post_id) for post_id in post_ids]
+        versions = get_versions(version_keys + [version_key('recent'), version_key('subscriptions', user.id)])
+        pending = reaction_buffer.pending(post_ids)
+        etag = make_etag('feed', user.id, post_ids, next_cursor, [versions[key] for key in version_keys], pending)
+        modified = last_modified(Post.objects.filter(pk__in=post_ids), versions.values())
+        cached_response = not_modified(request, etag, modified)
+        if cached_response is not None:
+            return cached_response
+
+        # 4 Serialize, reusing cached renders; comment previews are fetched only for posts that missed
+        results = render_posts(
+            post_ids, feedSerializer,
+            loaded={post.id: post for post in posts},
+            prepare=lambda missing: Comment.attach_previews(missing, FEED_COMMENT_PREVIEW_SIZE),
+            versions=versions,
+        )
+        # counters don't include reactions still in the write-behind buffer
+        response = Response({"results": merge_counts(results, pending), "next_cursor": next_cursor})
+        return set_validators(response, etag, modified)
     
+class SearchView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """
+        Full-text search over posts and comments: ?q= matches every word
+        as a prefix, best matches first. Pass `next_cursor` back as
+        `?cursor=` for the following page.
+        """
+        if not search_enabled():
+            return Response({"message": "Search is not available."}, status=status.HTTP_501_NOT_IMPLEMENTED)
+        try:
+            cursor, limit = page_params(request)
+            after = None
+            if cursor:
+                if not isinstance(cursor.get('r'), (int, float)) or not isinstance(cursor.get('id'), int):
+                    raise CursorError("Invalid cursor")
+                after = (cursor['r'], cursor['id'])
+            hits = search(request.query_params.get('q', ''), after, limit + 1)
+        except (CursorError, SearchError) as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        next_cursor = None
+        if len(hits) > limit:
+            hits = hits[:limit]
+            next_cursor = encode_cursor({'r': hits[-1]['score'], 'id': hits[-1]['rowid']})
+
+        # Matched comments plus the (cached) feed render of every post involved
+        post_ids = list(dict.fromkeys(hit['post_id'] for hit in hits))
+        rendered = render_posts(
+            post_ids, feedSerializer,
+            prepare=lambda missing: Comment.attach_previews(missing, FEED_COMMENT_PREVIEW_SIZE),
+        )
+        posts = {item['id']: item for item in merge_counts(rendered)}
+        comments = Comment.objects.select_related('user').in_bulk(
+            [hit['object_id'] for hit in hits if hit['kind'] == 'comment']
+        )
+        results = []
+        for hit in hits:
+            comment = comments.get(hit['object_id']) if hit['kind'] == 'comment' else None
+            if hit['post_id'] not in posts or (hit['kind'] == 'comment' and comment is None):
+                continue
+            results.append({
+                "type": hit['kind'],
+                "id": hit['object_id'],
+                "snippet": hit['snippet'],
+                "post": posts[hit['post_id']],
+                "comment": CommentSerializer(comment).data if comment else None,
+            })
+        return Response({"results": results, "next_cursor": next_cursor})
+
 class NotificationListAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
         """
         Return only unread notifications for the authenticated user
-        (where is_read=False).
+        (above the read watermark and not marked read individually).
         """
-        unread_notifications = Notification.objects.filter(
-            receiver=request.user,
-            is_read=False
-        ).order_by('-created_at')  # optional: latest first
+        watermark = read_watermark(request.user.id)
+        unread_notifications = unread_queryset(request.user.id, watermark).order_by('-created_at')  # optional: latest first
 
-        serializer = NotificationSerializer(unread_notifications, many=True)
+        serializer = NotificationSerializer(unread_notifications, many=True, context={'read_watermark': watermark})
         return Response(serializer.data)
 
 class NotificationMarkAllReadAPIView(APIView):
@@ -292,9 +663,44 @@ class NotificationMarkAllReadAPIView(APIView):
 
     def post(self, request):
         """
-        Mark all user's notifications as read.
+        Mark all user's notifications as read by moving the read watermark.
         """
-        Notification.objects.filter(receiver=request.user, is_read=False).update(is_read=True)
+        mark_all_read(request.user.id)
         return Response({"detail": "All notifications marked read."})
-        
 
+class NotificationMarkReadAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk):
+        """
+        Mark a single notification as read.
+        """
+        mark_read(request.user.id, pk)
+        return Response({"detail": "Notification marked read."})
+
+class NotificationUnreadCountAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """
+        Unread badge count, served from the cache.
+        """
+        return Response({"unread_count": get_unread_count(request.user.id)})
+
+class AuthCacheStatsAPIView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        """
+        Hit/miss counters of this process's user and token caches.
+        """
+        return Response(user_cache_stats())
+
+class WebSocketStatsAPIView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        """
+        Outbound queue depth and dropped-message counters of this process's websocket connections.
+        """
+        return Response(websocket_connection_stats())